@@ -1,17 +1,24 @@
 # app.py
-import io
-from typing import List, Dict, Any
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, Any, Optional
 
 import streamlit as st
-from docx import Document
 
-from generator import generate_lesson_plans_from_pdf
+from lesson_schema import SYSTEM_FIELDS
+from metrics import registry, timed
 from config import (
     DEFAULT_DOMAINS,
     DEFAULT_CURRICULAR_GOALS,
     DEFAULT_COMPETENCIES,
+    JOB_POLL_SECONDS,
+    LESSON_COMPRESSION_TARGET_TOKENS,
 )
 
+# Full-script runs are timed as "ui_run", fragment-only reruns under their own stage
+run_started = time.perf_counter()
+
 st.set_page_config(
     page_title="Lesson Plan Generator",
     page_icon="📘",
@@ -208,31 +215,81 @@ section[data-testid="stSidebar"] div[data-baseweb="select"] > div:hover {
 
 st.title("📘 Lesson Plan Generator")
 
-# ---------------------------------------
-# SIDEBAR
-# ---------------------------------------
-with st.sidebar:
-    st.header("Configuration")
+# Uploaded before the sidebar is drawn so preprocessing can start (and the
+# auto lesson count can size the topic inputs) while topics are typed
+uploaded_file = st.file_uploader("Upload chapter/poem PDF", type=["pdf"])
+preview_area = st.container()
 
-    grade = st.text_input("Grade", "")
-    chapter_name = st.text_input("Chapter Name", "")
-    page_no = st.text_input("Page No / Range", "")
+def render_section(key: str, value: Any) -> None:
+    st.markdown(f"**{key.replace('_',' ').title()}:**")
+    if isinstance(value, list):
+        for item in value:
+            st.markdown(f"- {item}")
+    else:
+        st.write(value)
 
-    num_lessons_option = st.selectbox(
-        "Number of Lesson Plans",
-        ["Auto-decide (4–6)", "3", "4", "5", "6"],
-    )
 
-    override_num_lessons = (
-        int(num_lessons_option)
-        if num_lessons_option != "Auto-decide (4–6)"
-        else None
-    )
+# Fair-share key for the rate limiter shared by every session in this process
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+
+@st.cache_resource
+def get_services():
+    """
+    Job manager and metrics endpoint, created once per process. job_queue is
+    imported here rather than at the top so the first page paints before
+    the generator stack is loaded.
+    """
+    from job_queue import get_job_manager
+    from metrics import start_metrics_server
 
-    lesson_count_for_ui = override_num_lessons or 4
+    start_metrics_server()
+    return get_job_manager()
+
+
+# Generation runs in background jobs; ?job=<id> reattaches after a refresh
+job_manager = get_services()
+if "job_id" not in st.session_state and st.query_params.get("job"):
+    st.session_state.job_id = st.query_params["job"]
+
+
+# ---------------------------------------
+# SIDEBAR
+# ---------------------------------------
+# Text fields sit in fragments, so typing reruns only that fragment (not the
+# stored lesson plans); inputs that change preprocessing rerun the page
+@st.fragment
+@timed("ui_chapter_fields")
+def chapter_fields() -> None:
+    st.text_input("Grade", "", key="grade")
+    st.text_input("Chapter Name", "", key="chapter_name")
+
+
+@st.fragment
+@timed("ui_lesson_settings")
+def lesson_settings(
+    lesson_count_for_ui: int,
+    preview: Optional[Dict[str, Any]],
+    auto_decided: bool,
+) -> None:
+    """
+    Compression, topics and sections; the values are kept in
+    st.session_state.lesson_settings for the Generate button.
+    """
+    compress_tokens = st.number_input(
+        "Max lesson text per lesson (tokens)",
+        min_value=0,
+        value=LESSON_COMPRESSION_TARGET_TOKENS,
+        step=250,
+        help="Longer lesson chunks are shortened to their most important, "
+        "on-topic sentences before generation. 0 sends the whole chunk.",
+    )
 
     # ---------- TOPICS ----------
     st.subheader("Topic Names (Required)")
+    if preview and auto_decided:
+        st.caption(f"Auto-decided: {preview['num_lessons']} lessons for {preview['word_count']} words")
     topic_names = []
     for i in range(lesson_count_for_ui):
         topic = st.text_input(f"Topic for Lesson {i + 1}", key=f"topic_{i}")
@@ -317,46 +374,412 @@ with st.sidebar:
                     "content": content.strip()
                 })
 
+    st.markdown("---")
+    force_fresh = st.checkbox(
+        "Force fresh generation (skip cache)",
+        value=False,
+        help="Ignore previously cached AI responses for identical inputs.",
+    )
+
+    st.session_state.lesson_settings = {
+        "topic_names": topic_names,
+        "domains": domains,
+        "curricular_goals": curricular_goals,
+        "competencies": competencies,
+        "extra_sections": extra_sections,
+        "include_learning_outcomes": include_learning_outcomes,
+        "include_teaching_aids": include_teaching_aids,
+        "include_strategy": include_strategy,
+        "include_interdisciplinary": include_interdisciplinary,
+        "include_extended": include_extended,
+        "use_cache": not force_fresh,
+        "compress_tokens": int(compress_tokens),
+    }
+
+
+@st.fragment
+@timed("ui_jobs_panel")
+def jobs_panel() -> None:
+    st.subheader("Jobs")
+    reattach_id = st.text_input("Job ID", "", help="Paste a job ID to see its progress or results.")
+    if st.button("Open Job") and reattach_id.strip():
+        st.session_state.job_id = reattach_id.strip()
+        st.session_state.pop("lesson_plan_result", None)
+        st.query_params["job"] = st.session_state.job_id
+        st.rerun()
+    for job in job_manager.store.list_jobs(st.session_state.session_id, limit=5):
+        st.caption(f"{job['chapter_name'] or 'Untitled'} - {job['status']} - `{job['id']}`")
+
+
+with st.sidebar:
+    st.header("Configuration")
+
+    chapter_fields()
+
+    page_no = st.text_input(
+        "Page No / Range",
+        "",
+        help="e.g. 112-131 or 12-18, 22. Only these pages of the PDF are used; "
+        "leave blank to use the whole file.",
+    )
+
+    num_lessons_option = st.selectbox(
+        "Number of Lesson Plans",
+        ["Auto-decide (4–6)", "3", "4", "5", "6"],
+    )
+
+    override_num_lessons = (
+        int(num_lessons_option)
+        if num_lessons_option != "Auto-decide (4–6)"
+        else None
+    )
+
+    align_to_topics = st.checkbox(
+        "Match text to topic names",
+        value=False,
+        help="Split the chapter where the text best matches each topic "
+        "instead of into equal-size parts.",
+    )
+
+    # ---------- SPECULATIVE PREPROCESSING ----------
+    # Extraction and chunking run in the background from the moment a PDF is
+    # uploaded; the generation job later finds the results in the cache
+    preview = None
+    preview_error = None
+    preview_future = None
+    if uploaded_file:
+        prefetch_key = (uploaded_file.file_id, page_no, override_num_lessons, align_to_topics)
+        if st.session_state.get("prefetch_key") != prefetch_key:
+            from generator import prefetch_lesson_chunks
+
+            st.session_state.prefetch_key = prefetch_key
+            st.session_state.prefetch = prefetch_lesson_chunks(
+                uploaded_file.getvalue(),
+                page_no,
+                override_num_lessons,
+                "topics" if align_to_topics else None,
+            )
+        preview_future = st.session_state.prefetch
+        if preview_future.done():
+            try:
+                preview = preview_future.result()
+            except Exception as e:
+                preview_error = str(e)
+
+    lesson_count_for_ui = override_num_lessons or (preview["num_lessons"] if preview else 4)
+    lesson_settings(lesson_count_for_ui, preview, auto_decided=not override_num_lessons)
+
+    st.markdown("---")
+    jobs_panel()
+
 # ---------------------------------------
 # MAIN
 # ---------------------------------------
-uploaded_file = st.file_uploader("Upload chapter/poem PDF", type=["pdf"])
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def await_future(future: Future, message: str) -> None:
+    # Reruns the page once background work (PDF extraction, Word export) is
+    # done, so its results appear without a click
+    if future.done():
+        st.rerun()
+    st.caption(message)
+
+
+if uploaded_file:
+    with preview_area:
+        if preview_error:
+            st.warning(f"Could not read the PDF: {preview_error}")
+        elif preview is None:
+            await_future(preview_future, "Reading the PDF...")
+        else:
+            if preview.get("page_warning"):
+                st.warning(preview["page_warning"])
+            st.caption(
+                f"{preview['word_count']} words - {preview['num_lessons']} lessons "
+                f"(text ready in {sum(preview['timings'].values()):.1f}s)"
+            )
+            if preview["chunks"]:
+                with st.expander("Preview lesson chunks"):
+                    for n, chunk in enumerate(preview["chunks"], start=1):
+                        st.markdown(f"**Lesson {n}** - {len(chunk.split())} words")
+                        st.text(chunk[:400] + ("..." if len(chunk) > 400 else ""))
+
+previous_result = st.session_state.get("lesson_plan_result")
+# With an auto-decided lesson count the topic inputs are only final once
+# the preview has counted the lessons
+awaiting_lesson_count = not override_num_lessons and preview is None and preview_error is None
+generate_clicked = bool(uploaded_file) and st.button(
+    "Generate Lesson Plans",
+    disabled=awaiting_lesson_count,
+    help="Available once the PDF has been read and the lessons counted."
+    if awaiting_lesson_count else None,
+)
+# Re-calls the AI only for lessons whose text, topic or sections changed
+regenerate_clicked = (
+    bool(uploaded_file)
+    and bool(previous_result and previous_result.get("fingerprints"))
+    and st.button(
+        "Regenerate Changed Lessons",
+        help="Keeps unchanged lessons, drops removed sections and generates only "
+        "new sections or lessons whose topic or text changed.",
+        disabled=awaiting_lesson_count,
+    )
+)
 
-if uploaded_file and st.button("Generate Lesson Plans"):
-    if any(not t for t in topic_names):
+if generate_clicked or regenerate_clicked:
+    settings = st.session_state.lesson_settings
+    if any(not t for t in settings["topic_names"]):
         st.error("All topic names are required.")
         st.stop()
+    if preview and not override_num_lessons and len(settings["topic_names"]) != preview["num_lessons"]:
+        st.error(
+            f"This chapter was split into {preview['num_lessons']} lessons; "
+            f"enter {preview['num_lessons']} topic names."
+        )
+        st.stop()
 
-    result = generate_lesson_plans_from_pdf(
-        file_bytes=uploaded_file.read(),
-        grade=grade,
-        chapter_name=chapter_name,
-        topic_names=topic_names,
+    params = dict(
+        settings,
+        grade=st.session_state.grade,
+        chapter_name=st.session_state.chapter_name,
         page_no=page_no,
         override_num_lessons=override_num_lessons,
-        domains=domains,
-        curricular_goals=curricular_goals,
-        competencies=competencies,
-        extra_sections=extra_sections,
-        include_learning_outcomes=include_learning_outcomes,
-        include_teaching_aids=include_teaching_aids,
-        include_strategy=include_strategy,
-        include_interdisciplinary=include_interdisciplinary,
-        include_extended=include_extended,
+        chunking_mode="topics" if align_to_topics else None,
+    )
+    if regenerate_clicked:
+        params["previous_result"] = {
+            "lesson_plans": previous_result["lesson_plans"],
+            "fingerprints": previous_result["fingerprints"],
+        }
+
+    st.session_state.job_id = job_manager.submit(
+        file_bytes=uploaded_file.getvalue(),
+        params=params,
+        session_id=st.session_state.session_id,
     )
+    st.query_params["job"] = st.session_state.job_id
+    st.session_state.pop("lesson_plan_result", None)
+
+# ---------------------------------------
+# JOB PROGRESS
+# ---------------------------------------
+# Polls the job store on its own schedule, so a refresh or widget change
+# never interrupts generation and the rest of the page is not redrawn
+@st.fragment(run_every=JOB_POLL_SECONDS)
+@timed("ui_job_progress")
+def job_progress() -> None:
+    if "job_id" not in st.session_state:
+        return
+    job = job_manager.get_job(st.session_state.job_id)
+
+    if job is None:
+        st.error(f"No job with ID {st.session_state.job_id}.")
+        del st.session_state.job_id
+        st.query_params.clear()
+
+    elif job["status"] == "done":
+        st.session_state["lesson_plan_result"] = job["result"]
+        st.rerun()
+
+    elif job["status"] == "failed":
+        st.error(f"Generation failed: {job['error']}")
+
+    else:
+        st.caption(f"Job ID: `{job['id']}` - you can close this page and come back later.")
+        if job["status"] == "queued":
+            st.info(
+                "Waiting for a free worker"
+                + (f" ({job['jobs_ahead']} jobs ahead)" if job["jobs_ahead"] else "")
+            )
+        elif job["queue"]:
+            st.info(
+                f"Waiting for the AI service: position {job['queue']['position']} in queue "
+                f"(about {job['queue'].get('estimated_wait_s', 0):.0f}s)"
+            )
+
+        if job["num_lessons"]:
+            st.progress(
+                job["completed"] / job["num_lessons"],
+                text=f"Generated {job['completed']} of {job['num_lessons']} lesson plans",
+            )
+            for n, topic in enumerate(job["topic_names"], start=1):
+                with st.expander(f"Lesson Plan {n}: {topic}", expanded=True):
+                    done = job["lessons"].get(n)
+                    if done is None:
+                        sections = job["sections"].get(n, [])
+                        st.caption("Writing..." if sections else "Waiting for the AI service...")
+                        for key, value in sections:
+                            render_section(key, value)
+                    elif done["error"]:
+                        st.error(f"Failed: {done['error']}")
+                    else:
+                        first_section = done["stats"].get("time_to_first_section_s")
+                        st.caption(
+                            f"Done - first section after {first_section:.1f}s" if first_section else "Done"
+                        )
+                        for key, value in done["lesson"].items():
+                            if key not in SYSTEM_FIELDS:
+                                render_section(key, value)
+        else:
+            st.progress(0.0, text="Preparing the chapter...")
 
-    st.session_state["lesson_plan_result"] = result
 
 # ---------------------------------------
 # DISPLAY
 # ---------------------------------------
-if "lesson_plan_result" in st.session_state:
-    for lp in st.session_state["lesson_plan_result"]["lesson_plans"]:
+# A fragment, so toggling the timing breakdown does not redraw the sidebar
+@st.fragment
+@timed("ui_results")
+def show_results() -> None:
+    page_warning = st.session_state["lesson_plan_result"].get("page_warning")
+    if page_warning:
+        st.warning(page_warning)
+
+    for err in st.session_state["lesson_plan_result"].get("errors", []):
+        st.warning(f"Lesson Plan {err['lesson_plan_no']} failed: {err['error']}")
+
+    cache_stats = st.session_state["lesson_plan_result"].get("cache_stats")
+    if cache_stats:
+        st.caption(
+            f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['entries']} entries stored)"
+        )
+
+    cleanup = st.session_state["lesson_plan_result"].get("cleanup")
+    if cleanup and cleanup.get("tokens_before"):
+        st.caption(
+            f"Boilerplate removed: {cleanup['words_before'] - cleanup['words_after']} words, "
+            f"{cleanup['tokens_before'] - cleanup['tokens_after']} tokens "
+            f"({1 - cleanup['tokens_after'] / cleanup['tokens_before']:.1%} of the extracted text)"
+        )
+
+    regeneration = st.session_state["lesson_plan_result"].get("regeneration")
+    if regeneration:
+        st.caption(
+            f"Regenerated: {regeneration.get('reuse', 0)} lessons unchanged, "
+            f"{regeneration.get('update', 0)} with sections added/removed, "
+            f"{regeneration.get('generate', 0)} generated again"
+        )
+
+    compression = st.session_state["lesson_plan_result"].get("compression")
+    if compression and compression.get("tokens_saved"):
+        st.caption(
+            f"Compression: {compression['tokens_saved']} of {compression['tokens_before']} lesson-text tokens "
+            f"saved ({compression['lessons_compressed']} lessons shortened to ~{compression['target_tokens']} tokens)"
+        )
+
+    chunk_tokens = st.session_state["lesson_plan_result"].get("chunk_tokens")
+    if chunk_tokens:
+        st.caption("Tokens per lesson chunk: " + ", ".join(str(t) for t in chunk_tokens))
+
+    lesson_stats = st.session_state["lesson_plan_result"].get("lesson_stats") or []
+
+    usage = st.session_state["lesson_plan_result"].get("usage")
+    show_timings = st.checkbox(
+        "Show timing breakdown",
+        value=False,
+        help="Time per stage (extraction, chunking, AI calls) and token usage.",
+    )
+    if show_timings and usage:
+        with st.expander("Timing breakdown", expanded=True):
+            run_timings = st.session_state["lesson_plan_result"].get("timings", {})
+            st.markdown(
+                f"**Total:** {run_timings.get('total', 0.0):.1f}s - "
+                f"text extraction {run_timings.get('preprocess_text', 0.0):.2f}s, "
+                f"chunking {run_timings.get('chunk_plan', 0.0):.2f}s"
+            )
+            st.markdown(
+                f"**Tokens:** {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion, "
+                f"{usage['retries']} retries, {usage['cache_hits']} cache hits"
+            )
+            if usage.get("hedges") or usage.get("deadline_exceeded"):
+                st.markdown(
+                    f"**Hedging:** {usage['hedges']} duplicate requests "
+                    f"({usage['hedge_rate']:.0%} of calls), {usage['hedge_wins']} won, "
+                    f"~{usage['hedge_saved_s']:.1f}s saved; "
+                    f"{usage['deadline_exceeded']} lessons hit their time budget"
+                )
+            st.table([
+                {
+                    "Lesson": n,
+                    "Queue wait (s)": round(stats.get("timings", {}).get("queue_wait", 0.0), 2),
+                    "AI call (s)": round(stats.get("timings", {}).get("llm_call", 0.0), 2),
+                    "JSON parse (s)": round(stats.get("timings", {}).get("parse", 0.0), 3),
+                    "Retries": stats.get("retries", 0),
+                    "Prompt tokens": stats.get("prompt_tokens", 0),
+                    "Completion tokens": stats.get("completion_tokens", 0),
+                    "Cached": bool(stats.get("cache_hit")),
+                }
+                for n, stats in enumerate(lesson_stats, start=1)
+            ])
+
+    # ---------- EXPORT ----------
+    # Word files are rendered on a background thread and cached by a hash of
+    # the lesson plans, so reruns and repeat downloads never render again
+    from export import DOCX_MIME, ZIP_MIME, result_digest, submit_export
+
+    lesson_plans = st.session_state["lesson_plan_result"]["lesson_plans"]
+    export_key = result_digest(lesson_plans)
+    if st.session_state.get("export_key") != export_key:
+        st.session_state.export_key = export_key
+        st.session_state.export = submit_export(lesson_plans)
+    exported = None
+    if not st.session_state.export.done():
+        await_future(st.session_state.export, "Preparing Word files...")
+    else:
+        try:
+            exported = st.session_state.export.result()
+        except Exception as e:
+            st.warning(f"Word export failed: {e}")
+    if exported and exported["lessons"]:
+        st.download_button(
+            "Download all lesson plans (.zip)",
+            exported["zip"],
+            file_name=exported["filename"],
+            mime=ZIP_MIME,
+            on_click="ignore",
+        )
+    if exported and exported["skipped"]:
+        st.caption(
+            "Not in the download (generation failed): lesson plan "
+            + ", ".join(str(n) for n in exported["skipped"])
+        )
+
+    for idx, lp in enumerate(lesson_plans):
         with st.expander(f"Lesson Plan {lp['lesson_plan_no']}"):
+            stats = lesson_stats[idx] if idx < len(lesson_stats) else {}
+            if stats.get("cache_hit"):
+                st.caption("Served from cache")
+            elif stats.get("batch") and not stats.get("batch_fallback"):
+                batch = stats["batch"]
+                st.caption(
+                    f"Generated with {batch.get('batch_size', 0) - 1} other lessons "
+                    f"in one request ({batch.get('latency_s', 0.0):.1f}s)"
+                )
+            elif "latency_s" in stats:
+                first_section = stats.get("time_to_first_section_s")
+                st.caption(
+                    f"Generated in {stats['latency_s']:.1f}s "
+                    + (f"(first section after {first_section:.1f}s, " if first_section else "(")
+                    + f"{stats.get('retries', 0)} retries, "
+                    f"{stats.get('retry_wait_s', 0.0):.1f}s backoff)"
+                )
             for k, v in lp.items():
-                st.markdown(f"**{k.replace('_',' ').title()}:**")
-                if isinstance(v, list):
-                    for i in v:
-                        st.markdown(f"- {i}")
-                else:
-                    st.write(v)
+                render_section(k, v)
+            if exported and lp["lesson_plan_no"] in exported["lessons"]:
+                file_name, data = exported["lessons"][lp["lesson_plan_no"]]
+                st.download_button(
+                    "Download as Word (.docx)",
+                    data,
+                    file_name=file_name,
+                    mime=DOCX_MIME,
+                    on_click="ignore",
+                    key=f"docx_{idx}",
+                )
+
+
+if "lesson_plan_result" in st.session_state:
+    show_results()
+elif "job_id" in st.session_state:
+    job_progress()
+
+registry.observe("lessonplan_stage_duration_seconds", time.perf_counter() - run_started, stage="ui_run")
@@ -0,0 +1,413 @@
+# batch_generate.py
+"""
+Headless batch generation: runs many chapter PDFs through the generator
+without the Streamlit UI, checkpointing each finished lesson so an
+interrupted run can be resumed without repeating LLM calls.
+
+Usage:
+    python batch_generate.py chapters/ --output-dir out/
+    python batch_generate.py manifest.jsonl --workers 2 --checkpoint run.jsonl
+    python batch_generate.py chapters/ --export-zip lesson_plans.zip
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    DEFAULT_DOMAINS,
+    DEFAULT_CURRICULAR_GOALS,
+    DEFAULT_COMPETENCIES,
+    LLM_MAX_CONCURRENCY,
+    METRICS_PORT,
+    CHUNKING_MODE,
+    LESSON_COMPRESSION_TARGET_TOKENS,
+    LLM_BATCH_MODE,
+)
+from generator import generate_lesson_plans_from_pdf, plan_lesson_chunks
+from preprocess_cache import file_digest
+from metrics import start_metrics_server
+
+INCLUDE_FLAGS = [
+    "include_learning_outcomes",
+    "include_teaching_aids",
+    "include_strategy",
+    "include_interdisciplinary",
+    "include_extended",
+]
+
+
+# -------- JOB LOADING --------
+def _normalize_job(entry: Dict[str, Any], base_dir: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fills a manifest entry with defaults and resolves its PDF path.
+    """
+    if not entry.get("pdf"):
+        raise ValueError(f"Manifest entry without a 'pdf' path: {entry}")
+
+    job = dict(defaults)
+    job.update(entry)
+    job["pdf"] = os.path.normpath(os.path.join(base_dir, entry["pdf"]))
+    job.setdefault("chapter_name", os.path.splitext(os.path.basename(job["pdf"]))[0])
+    if not job.get("grade"):
+        raise ValueError(f"No grade given for {job['pdf']} (use --grade or the manifest)")
+
+    job["topic_names"] = [t for t in (job.get("topic_names") or []) if t and t.strip()]
+    job["page_no"] = str(job.get("page_no") or "")
+    job["num_lessons"] = job.get("num_lessons") or None
+    job.setdefault("domains", DEFAULT_DOMAINS)
+    job.setdefault("curricular_goals", DEFAULT_CURRICULAR_GOALS)
+    job.setdefault("competencies", DEFAULT_COMPETENCIES)
+    job.setdefault("extra_sections", [])
+    for flag in INCLUDE_FLAGS:
+        job[flag] = bool(job.get(flag, True))
+    return job
+
+
+def load_jobs(source: str, defaults: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Reads jobs from a directory of PDFs (metadata in an optional
+    "<name>.json" next to each PDF) or from a manifest file
+    (a JSON list, or JSONL with one entry per line).
+    """
+    if os.path.isdir(source):
+        jobs = []
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            entry: Dict[str, Any] = {}
+            sidecar = os.path.join(source, os.path.splitext(name)[0] + ".json")
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            entry["pdf"] = name
+            jobs.append(_normalize_job(entry, source, defaults))
+        return jobs
+
+    with open(source, "r", encoding="utf-8") as f:
+        raw = f.read()
+    base_dir = os.path.dirname(os.path.abspath(source))
+    if raw.lstrip().startswith("["):
+        entries = json.loads(raw)
+    else:
+        entries = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    return [_normalize_job(entry, base_dir, defaults) for entry in entries]
+
+
+def job_key(
+    job: Dict[str, Any],
+    digest: str,
+    chunking_mode: Optional[str] = None,
+    compress_tokens: Optional[int] = None,
+    batch_mode: Optional[bool] = None,
+) -> str:
+    """
+    Identifies a job by PDF content and every input that changes the
+    generated lessons, so edited metadata is never resumed from stale output.
+    The run options are keyed by their effective values (config defaults
+    filled in), so changing chunking, compression or batching starts over.
+    """
+    fields = {k: v for k, v in job.items() if k != "pdf"}
+    options = {
+        "chunking_mode": chunking_mode or CHUNKING_MODE,
+        "compress_tokens": LESSON_COMPRESSION_TARGET_TOKENS if compress_tokens is None else compress_tokens,
+        "batch_mode": LLM_BATCH_MODE if batch_mode is None else batch_mode,
+    }
+    payload = json.dumps({"digest": digest, "job": fields, "options": options}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -------- CHECKPOINT --------
+class LessonCheckpoint:
+    """
+    Append-only JSONL log of finished lessons, one line per lesson.
+    Lines are flushed and fsynced as they are written, so a killed run
+    loses at most the lessons that were still in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: Dict[str, Dict[int, Dict[str, Any]]] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A partial last line from an interrupted write
+                        continue
+                    lessons = self._done.setdefault(record["job_key"], {})
+                    lessons[int(record["lesson_plan_no"])] = record["lesson"]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def completed(self, key: str) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._done.get(key, {}))
+
+    def record(self, key: str, pdf: str, lesson: Dict[str, Any], stats: Dict[str, Any]) -> None:
+        line = json.dumps(
+            {
+                "job_key": key,
+                "pdf": pdf,
+                "lesson_plan_no": lesson["lesson_plan_no"],
+                "lesson": lesson,
+                "stats": stats,
+                "finished_at": time.time(),
+            },
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._done.setdefault(key, {})[int(lesson["lesson_plan_no"])] = lesson
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+# -------- RUNNING --------
+def run_job(
+    job: Dict[str, Any],
+    checkpoint: LessonCheckpoint,
+    output_dir: str,
+    lesson_concurrency: int,
+    use_cache: bool,
+    chunking_mode: Optional[str],
+    batch_mode: Optional[bool],
+    compress_tokens: Optional[int] = None,
+    incremental: bool = False,
+) -> Dict[str, Any]:
+    """
+    Generates one PDF's lesson plans, skipping lessons already in the
+    checkpoint, and writes the result JSON to output_dir. With incremental,
+    an earlier result JSON for the PDF is updated: only lessons whose text,
+    topic or sections changed are sent to the LLM.
+    """
+    with open(job["pdf"], "rb") as f:
+        file_bytes = f.read()
+    key = job_key(job, file_digest(file_bytes), chunking_mode, compress_tokens, batch_mode)
+    completed = checkpoint.completed(key)
+
+    out_path = os.path.join(output_dir, os.path.splitext(os.path.basename(job["pdf"]))[0] + ".json")
+    previous_result = None
+    if incremental and os.path.exists(out_path):
+        with open(out_path, "r", encoding="utf-8") as f:
+            previous_result = json.load(f)
+
+    # Lesson count (and so the number of topic names needed) comes from chunking
+    topic_names = list(job["topic_names"])
+    plan = plan_lesson_chunks(
+        file_bytes, job["page_no"], job["num_lessons"], chunking_mode, topic_names or None
+    )
+    for n in range(len(topic_names), plan["num_lessons"]):
+        topic_names.append(f"{job['chapter_name']} (Part {n + 1})")
+
+    def on_progress(event: Dict[str, Any]) -> None:
+        if event["type"] != "lesson" or "error" in event:
+            return
+        if event["stats"].get("resumed"):
+            return
+        checkpoint.record(key, job["pdf"], event["lesson"], event["stats"])
+
+    result = generate_lesson_plans_from_pdf(
+        file_bytes=file_bytes,
+        grade=job["grade"],
+        chapter_name=job["chapter_name"],
+        topic_names=topic_names,
+        page_no=job["page_no"],
+        override_num_lessons=job["num_lessons"],
+        domains=job["domains"],
+        curricular_goals=job["curricular_goals"],
+        competencies=job["competencies"],
+        extra_sections=job["extra_sections"],
+        include_learning_outcomes=job["include_learning_outcomes"],
+        include_teaching_aids=job["include_teaching_aids"],
+        include_strategy=job["include_strategy"],
+        include_interdisciplinary=job["include_interdisciplinary"],
+        include_extended=job["include_extended"],
+        max_concurrency=lesson_concurrency,
+        use_cache=use_cache,
+        chunking_mode=chunking_mode,
+        progress_callback=on_progress,
+        session_id=key[:16],
+        batch_mode=batch_mode,
+        completed_lessons=completed,
+        compress_tokens=compress_tokens,
+        previous_result=previous_result,
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"pdf": job["pdf"], "job_key": key, **result},
+            f,
+            ensure_ascii=False,
+            indent=2,
+            default=str,
+        )
+
+    resumed = sum(1 for s in result["lesson_stats"] if s.get("resumed"))
+    reused = sum(1 for s in result["lesson_stats"] if s.get("regeneration") == "reuse")
+    return {
+        "pdf": job["pdf"],
+        "output": out_path,
+        "lessons": result["num_lessons"],
+        "resumed": resumed,
+        "failed": len(result["errors"]),
+        "reused": reused,
+        "generated": result["num_lessons"] - resumed - reused - len(result["errors"]),
+        "tokens": result["usage"]["prompt_tokens"] + result["usage"]["completion_tokens"],
+        "cleanup": result.get("cleanup") or {},
+        "page_warning": result.get("page_warning"),
+        "compression": result.get("compression") or {},
+    }
+
+
+def iter_output_chapters(summaries: List[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    (folder name, lesson_plans) per finished PDF, read from its output file
+    only when the ZIP writer gets to it.
+    """
+    for summary in sorted(summaries, key=lambda s: s["output"]):
+        with open(summary["output"], encoding="utf-8") as f:
+            lesson_plans = json.load(f)["lesson_plans"]
+        yield os.path.splitext(os.path.basename(summary["pdf"]))[0], lesson_plans
+
+
+def print_summary(summaries: List[Dict[str, Any]], failures: List[Dict[str, Any]], elapsed: float) -> None:
+    generated = sum(s["generated"] for s in summaries)
+    resumed = sum(s["resumed"] for s in summaries)
+    failed = sum(s["failed"] for s in summaries)
+    tokens = sum(s["tokens"] for s in summaries)
+    minutes = max(elapsed, 1e-9) / 60
+
+    print()
+    print(f"PDFs:      {len(summaries)} done, {len(failures)} failed")
+    print(f"Lessons:   {generated} generated, {resumed} resumed from checkpoint, {failed} failed")
+    print(f"Elapsed:   {elapsed:.1f}s")
+    print(f"Throughput: {generated / minutes:.2f} lessons/min, {tokens / minutes:.0f} tokens/min")
+    for failure in failures:
+        print(f"  FAILED {failure['pdf']}: {failure['error']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate lesson plans for many chapter PDFs without the UI."
+    )
+    parser.add_argument("source", help="Directory of PDFs or a JSON/JSONL manifest")
+    parser.add_argument("--output-dir", default="lesson_plans", help="Where result JSON files are written")
+    parser.add_argument("--checkpoint", default=None, help="JSONL checkpoint (default: <output-dir>/checkpoint.jsonl)")
+    parser.add_argument("--workers", type=int, default=2, help="PDFs processed in parallel")
+    parser.add_argument("--lesson-concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="Lessons in flight per PDF")
+    parser.add_argument("--grade", default="", help="Default grade for entries that do not set one")
+    parser.add_argument("--chunking-mode", choices=["words", "tokens", "topics"], default=None)
+    parser.add_argument("--batch", dest="batch_mode", action="store_true", default=None, help="Pack several lessons per request")
+    parser.add_argument("--no-batch", dest="batch_mode", action="store_false")
+    parser.add_argument(
+        "--compress-tokens", type=int, default=None,
+        help="Keep at most this many lesson-text tokens per lesson (0 = off, default LESSON_COMPRESSION_TARGET_TOKENS)",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Update existing output files, regenerating only lessons/sections whose inputs changed",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    parser.add_argument(
+        "--export-zip", default=None,
+        help="Also write every lesson plan as a Word file into this ZIP (one folder per PDF)",
+    )
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve /metrics while running (0 = off)")
+    args = parser.parse_args(argv)
+    start_metrics_server(args.metrics_port)
+
+    try:
+        jobs = load_jobs(args.source, {"grade": args.grade})
+    except (OSError, ValueError) as e:
+        print(f"Could not read jobs: {e}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print("No PDFs found.", file=sys.stderr)
+        return 2
+
+    checkpoint = LessonCheckpoint(args.checkpoint or os.path.join(args.output_dir, "checkpoint.jsonl"))
+    summaries: List[Dict[str, Any]] = []
+    failures: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {
+                pool.submit(
+                    run_job,
+                    job,
+                    checkpoint,
+                    args.output_dir,
+                    max(1, args.lesson_concurrency),
+                    not args.no_cache,
+                    args.chunking_mode,
+                    args.batch_mode,
+                    args.compress_tokens,
+                    args.incremental,
+                ): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    failures.append({"pdf": job["pdf"], "error": str(e)})
+                    print(f"[failed] {job['pdf']}: {e}", file=sys.stderr)
+                    continue
+                summaries.append(summary)
+                print(
+                    f"[done] {summary['pdf']}: {summary['generated']} generated, "
+                    f"{summary['resumed']} resumed, {summary['reused']} unchanged, "
+                    f"{summary['failed']} failed -> {summary['output']}"
+                )
+                if summary["page_warning"]:
+                    print(f"       warning: {summary['page_warning']}")
+                cleanup = summary["cleanup"]
+                if cleanup.get("tokens_before"):
+                    print(
+                        f"       boilerplate: {cleanup['words_before'] - cleanup['words_after']} words, "
+                        f"{cleanup['tokens_before'] - cleanup['tokens_after']} tokens removed "
+                        f"({1 - cleanup['tokens_after'] / cleanup['tokens_before']:.1%})"
+                    )
+                compression = summary["compression"]
+                if compression.get("tokens_saved"):
+                    print(
+                        f"       compression: {compression['tokens_saved']} tokens saved over "
+                        f"{compression['lessons_compressed']} lessons"
+                    )
+    finally:
+        checkpoint.close()
+
+    print_summary(summaries, failures, time.perf_counter() - start)
+    if args.export_zip and summaries:
+        from export import write_zip
+
+        # Streamed: one document is rendered and held in memory at a time
+        with open(args.export_zip, "wb") as f:
+            size = write_zip(iter_output_chapters(summaries), f)
+        print(f"Export:    {args.export_zip} ({size / 1024:.0f} KiB)")
+    failed_lessons = sum(s["failed"] for s in summaries)
+    return 1 if failures or failed_lessons else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
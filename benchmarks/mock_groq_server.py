@@ -0,0 +1,269 @@
+# benchmarks/mock_groq_server.py
+"""
+Local OpenAI-compatible chat-completions server that imitates Groq closely
+enough for end-to-end runs without an API key: plain and streamed (SSE)
+replies, usage on the final chunk under x_groq, 429s with retry-after-ms
+and random 5xx errors, all with configurable latency.
+
+    python -m benchmarks.mock_groq_server --port 8765 --latency-ms 800
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=mock streamlit run app.py
+"""
+import argparse
+import ast
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+_SECTIONS_RE = re.compile(r"Include ONLY these (?:new )?sections[^\n]*:\n(\[[^\n]*\])")
+_LESSON_RE = re.compile(r"--- LESSON (\d+) ---")
+_SYSTEM_FIELDS = {"grade", "chapter_name", "topic_name", "page_no", "lesson_plan_no"}
+
+
+def _fake_lesson(sections: List[str], words_per_section: int) -> Dict[str, Any]:
+    lesson: Dict[str, Any] = {}
+    for key in sections:
+        if key in _SYSTEM_FIELDS:
+            continue
+        text = " ".join(["lorem"] * words_per_section)
+        lesson[key] = [text] if key.endswith("s") else text
+    return lesson
+
+
+def build_reply(prompt: str, words_per_section: int = 40) -> str:
+    """
+    A well-formed reply for the generator's single- or multi-lesson prompt.
+    """
+    match = _SECTIONS_RE.search(prompt)
+    sections = ast.literal_eval(match.group(1)) if match else ["learning_outcomes"]
+    lesson_numbers = [int(n) for n in _LESSON_RE.findall(prompt)]
+    if not lesson_numbers:
+        return json.dumps(_fake_lesson(sections, words_per_section))
+    return json.dumps({
+        "lessons": [
+            dict(_fake_lesson(sections, words_per_section), lesson_plan_no=n)
+            for n in lesson_numbers
+        ]
+    })
+
+
+class MockGroqServer:
+    """
+    Threaded HTTP server in the background. latency_ms +/- jitter_ms is the
+    time to the first byte; streamed replies then arrive over stream_ms.
+    error_rate and rate_limit_rate are per-request probabilities; slow_rate
+    of requests take slow_ms instead (a latency tail).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 500.0,
+        jitter_ms: float = 100.0,
+        stream_ms: float = 200.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after_ms: int = 100,
+        words_per_section: int = 40,
+        slow_rate: float = 0.0,
+        slow_ms: float = 5000.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.stream_ms = stream_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_ms = retry_after_ms
+        self.words_per_section = words_per_section
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                server._handle(self)
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockGroqServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "rate_limited": self.rate_limited}
+
+    # -------- REQUEST HANDLING --------
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            if self._rng.random() < self.slow_rate:
+                delay = self.slow_ms
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                outcome = "429"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                outcome = "500"
+            else:
+                outcome = "ok"
+        return outcome, delay / 1000.0
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, status: int, payload: Dict[str, Any], headers=None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        length = int(handler.headers.get("Content-Length") or 0)
+        request = json.loads(handler.rfile.read(length) or b"{}")
+        if not handler.path.endswith("/chat/completions"):
+            self._send_json(handler, 404, {"error": {"message": "not found"}})
+            return
+
+        outcome, delay = self._draw()
+        if outcome == "429":
+            self._send_json(
+                handler,
+                429,
+                {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(self.retry_after_ms)},
+            )
+            return
+
+        time.sleep(delay)
+        if outcome == "500":
+            self._send_json(handler, 500, {"error": {"message": "Internal server error"}})
+            return
+
+        prompt = "\n".join(m.get("content") or "" for m in request.get("messages", []))
+        content = build_reply(prompt, self.words_per_section)
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+        }
+        model = request.get("model", "mock")
+
+        if not request.get("stream"):
+            self._send_json(handler, 200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        # -------- STREAMING (SSE) --------
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        pieces = [content[i:i + 40] for i in range(0, len(content), 40)] or [""]
+        pause = (self.stream_ms / 1000.0) / len(pieces)
+        try:
+            for n, piece in enumerate(pieces):
+                last = n == len(pieces) - 1
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": piece},
+                        "finish_reason": "stop" if last else None,
+                    }],
+                }
+                if last:
+                    chunk["x_groq"] = {"usage": usage}
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                handler.wfile.flush()
+                if pause:
+                    time.sleep(pause)
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream early (e.g. off-schema abort)
+            pass
+        handler.close_connection = True
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Groq chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--stream-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-ms", type=int, default=100)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    args = parser.parse_args(argv)
+
+    server = MockGroqServer(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        stream_ms=args.stream_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_ms=args.retry_after_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+    )
+    print(f"Mock Groq API listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmarks for the PDF -> lesson plan pipeline, runnable without a Groq key:
+extraction throughput, chunking time per mode, and end-to-end generation
+against the local mock server (benchmarks/mock_groq_server.py).
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --tolerance 0.15
+
+Results are written as JSON; with --baseline the key metrics are compared
+and the run fails if any got worse by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.mock_groq_server import MockGroqServer
+from benchmarks.synthetic_pdf import TOPIC_VOCABULARY, make_chapter_pdf
+
+
+def _best_of(repeat: int, fn) -> Tuple[float, Any]:
+    """
+    Fastest wall time over repeat runs (and the last return value).
+    """
+    best = float("inf")
+    value = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(np.mean(values))}
+
+
+# -------- STAGES --------
+def bench_extraction(page_counts: List[int], words_per_page: int, repeat: int) -> List[Dict[str, Any]]:
+    from pdf_utils import extract_text_from_pdf
+
+    results = []
+    for num_pages in page_counts:
+        pdf = make_chapter_pdf(num_pages, words_per_page, seed=num_pages)
+        single, text = _best_of(repeat, lambda: extract_text_from_pdf(pdf, workers=1))
+        default, _ = _best_of(repeat, lambda: extract_text_from_pdf(pdf))
+        results.append({
+            "pages": num_pages,
+            "pdf_bytes": len(pdf),
+            "words": len(text.split()),
+            "single_process_s": single,
+            "single_process_pages_per_s": num_pages / single,
+            "default_s": default,
+            "default_pages_per_s": num_pages / default,
+        })
+    return results
+
+
+def bench_chunking(num_pages: int, words_per_page: int, num_lessons: int, repeat: int) -> Dict[str, Any]:
+    from chunking import split_into_lesson_chunks, split_into_topic_chunks, split_into_token_chunks
+    from pdf_utils import extract_text_from_pdf
+
+    topics = list(TOPIC_VOCABULARY)[:num_lessons]
+    text = extract_text_from_pdf(make_chapter_pdf(num_pages, words_per_page, topics=topics, seed=1), workers=1)
+    modes = {
+        "words": lambda: split_into_lesson_chunks(text, num_lessons),
+        "tokens": lambda: split_into_token_chunks(text, num_lessons),
+        "topics": lambda: split_into_topic_chunks(text, topics),
+    }
+
+    results: Dict[str, Any] = {"pages": num_pages, "words": len(text.split()), "num_lessons": num_lessons}
+    for mode, fn in modes.items():
+        try:
+            seconds, chunks = _best_of(repeat, fn)
+            results[mode] = {"seconds": seconds, "chunks": len(chunks)}
+        except Exception as e:
+            # e.g. tiktoken cannot fetch its encoding offline
+            results[mode] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def bench_end_to_end(
+    chapters: int,
+    pages_per_chapter: int,
+    words_per_page: int,
+    workers: int,
+    lesson_concurrency: int,
+    batch_mode: bool,
+) -> Dict[str, Any]:
+    from config import DEFAULT_DOMAINS, DEFAULT_CURRICULAR_GOALS, DEFAULT_COMPETENCIES
+    from generator import generate_lesson_plans_from_pdf
+
+    topics = list(TOPIC_VOCABULARY)[:4]
+    pdfs = [
+        make_chapter_pdf(pages_per_chapter, words_per_page, topics=topics, seed=100 + n)
+        for n in range(chapters)
+    ]
+
+    def run(n: int) -> Dict[str, Any]:
+        return generate_lesson_plans_from_pdf(
+            file_bytes=pdfs[n],
+            grade="6",
+            chapter_name=f"Benchmark Chapter {n + 1}",
+            topic_names=topics,
+            page_no="",
+            override_num_lessons=len(topics),
+            domains=DEFAULT_DOMAINS,
+            curricular_goals=DEFAULT_CURRICULAR_GOALS,
+            competencies=DEFAULT_COMPETENCIES,
+            extra_sections=[],
+            include_learning_outcomes=True,
+            include_teaching_aids=True,
+            include_strategy=True,
+            include_interdisciplinary=True,
+            include_extended=True,
+            max_concurrency=lesson_concurrency,
+            use_cache=False,
+            session_id=f"bench-{n}",
+            batch_mode=batch_mode,
+        )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(run, range(chapters)))
+    elapsed = time.perf_counter() - start
+
+    latencies, first_section, retries = [], [], 0
+    lessons = failed = hedges = hedge_wins = attempts = 0
+    hedge_saved = 0.0
+    for result in results:
+        lessons += len(result["lesson_plans"])
+        failed += len(result["errors"])
+        usage = result["usage"]
+        attempts += usage["attempts"]
+        hedges += usage["hedges"]
+        hedge_wins += usage["hedge_wins"]
+        hedge_saved += usage["hedge_saved_s"]
+        for stats in result["lesson_stats"]:
+            source = stats if "latency_s" in stats else stats.get("batch", {})
+            if "latency_s" in source:
+                latencies.append(source["latency_s"])
+            if "time_to_first_section_s" in stats:
+                first_section.append(stats["time_to_first_section_s"])
+            retries += stats.get("retries", 0)
+
+    return {
+        "chapters": chapters,
+        "lessons": lessons,
+        "failed_lessons": failed,
+        "elapsed_s": elapsed,
+        "lessons_per_s": (lessons - failed) / elapsed if elapsed else 0.0,
+        "retries": retries,
+        "hedges": hedges,
+        "hedge_rate": hedges / attempts if attempts else 0.0,
+        "hedge_wins": hedge_wins,
+        "hedge_saved_s": hedge_saved,
+        "lesson_latency_s": _percentiles(latencies),
+        "time_to_first_section_s": _percentiles(first_section),
+    }
+
+
+# -------- REGRESSION CHECK --------
+def key_metrics(report: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    """
+    Flat {name: (value, higher_is_better)} for comparing two reports.
+    """
+    metrics: Dict[str, Tuple[float, bool]] = {}
+    for row in report.get("extraction", []):
+        metrics[f"extraction.{row['pages']}p.pages_per_s"] = (row["default_pages_per_s"], True)
+    for mode in ("words", "tokens", "topics"):
+        seconds = report.get("chunking", {}).get(mode, {}).get("seconds")
+        if seconds is not None:
+            metrics[f"chunking.{mode}.seconds"] = (seconds, False)
+    e2e = report.get("end_to_end")
+    if e2e:
+        metrics["end_to_end.lessons_per_s"] = (e2e["lessons_per_s"], True)
+        for p in ("p50", "p95", "p99"):
+            if e2e["lesson_latency_s"][p] is not None:
+                metrics[f"end_to_end.latency_{p}_s"] = (e2e["lesson_latency_s"][p], False)
+    return metrics
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Prints the change of every shared metric; returns the regressed ones.
+    """
+    current, previous = key_metrics(report), key_metrics(baseline)
+    regressions = []
+    print(f"\n{'metric':40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous or not previous[name][0]:
+            continue
+        old = previous[name][0]
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:40} {old:12.4f} {value:12.4f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark extraction, chunking and generation.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200], help="PDF sizes for extraction")
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timing (best is kept)")
+    parser.add_argument("--lessons", type=int, default=4, help="Lessons per chapter when chunking")
+    parser.add_argument("--chapters", type=int, default=4, help="Chapters generated end to end (0 to skip)")
+    parser.add_argument("--chapter-pages", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2, help="Chapters generated in parallel")
+    parser.add_argument("--lesson-concurrency", type=int, default=4)
+    parser.add_argument("--batch", action="store_true", help="Use multi-lesson batching")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="Mock server time to first byte")
+    parser.add_argument("--jitter-ms", type=float, default=150.0)
+    parser.add_argument("--stream-ms", type=float, default=300.0, help="Mock server streaming duration")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of mock requests in the latency tail")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged requests")
+    parser.add_argument("--rate-limiter", action="store_true", help="Keep the client-side rate limiter on")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    server = MockGroqServer(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        stream_ms=args.stream_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        seed=0,
+    ).start()
+
+    # config is read at import time, so point the client at the mock first;
+    # any real keys or providers in the environment must not receive traffic
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ["GROQ_API_KEY"] = "mock"
+    for name in ("GROQ_API_KEYS", "LLM_PROVIDERS"):
+        os.environ.pop(name, None)
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    if not args.rate_limiter:
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "0"
+    if args.hedge:
+        os.environ["LLM_HEDGING_ENABLED"] = "1"
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+
+    try:
+        print("Extraction...")
+        report["extraction"] = bench_extraction(args.pages, args.words_per_page, args.repeat)
+        for row in report["extraction"]:
+            print(
+                f"  {row['pages']:>5} pages: {row['default_pages_per_s']:8.1f} pages/s "
+                f"({row['single_process_pages_per_s']:.1f} single process)"
+            )
+
+        print("Chunking...")
+        report["chunking"] = bench_chunking(
+            max(args.pages), args.words_per_page, args.lessons, args.repeat
+        )
+        for mode in ("words", "tokens", "topics"):
+            row = report["chunking"][mode]
+            print(f"  {mode:>6}: " + (f"{row['seconds'] * 1000:.1f} ms" if "seconds" in row else row["error"]))
+
+        if args.chapters > 0:
+            print("End to end (mock server)...")
+            e2e = bench_end_to_end(
+                args.chapters,
+                args.chapter_pages,
+                args.words_per_page,
+                args.workers,
+                args.lesson_concurrency,
+                args.batch,
+            )
+            e2e["server"] = server.stats()
+            report["end_to_end"] = e2e
+            latency = e2e["lesson_latency_s"]
+            print(
+                f"  {e2e['lessons']} lessons in {e2e['elapsed_s']:.1f}s = {e2e['lessons_per_s']:.2f} lessons/s, "
+                f"{e2e['failed_lessons']} failed, {e2e['retries']} retries, "
+                f"{e2e['hedges']} hedges ({e2e['hedge_wins']} won, ~{e2e['hedge_saved_s']:.1f}s saved)"
+            )
+            if latency["p50"] is not None:
+                print(
+                    f"  latency p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  "
+                    f"p99 {latency['p99']:.2f}s"
+                )
+    finally:
+        server.stop()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# benchmarks/synthetic_pdf.py
+import random
+from typing import List, Optional
+
+import fitz  # PyMuPDF
+
+# Small fixed vocabularies so runs are reproducible and topics are separable
+_COMMON_WORDS = (
+    "the a of and to in is that it for on with as was by this are be from "
+    "which at or an they one have were their has can all there when been"
+).split()
+
+TOPIC_VOCABULARY = {
+    "Photosynthesis": "leaf chlorophyll sunlight glucose carbon dioxide oxygen stomata plant energy".split(),
+    "Water Cycle": "evaporation condensation cloud rain river ocean vapour precipitation groundwater".split(),
+    "Fractions": "numerator denominator equivalent half quarter whole divide share simplify".split(),
+    "Freedom Movement": "independence protest leader salt march colonial nation congress freedom".split(),
+    "Magnetism": "magnet pole north south attract repel compass iron field needle".split(),
+    "Poetry": "poem stanza rhyme poet verse rhythm imagery metaphor line meaning".split(),
+}
+
+
+def _sentence(rng: random.Random, topic_words: List[str]) -> str:
+    length = rng.randint(8, 18)
+    words = [
+        rng.choice(topic_words) if rng.random() < 0.3 else rng.choice(_COMMON_WORDS)
+        for _ in range(length)
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def make_chapter_pdf(
+    num_pages: int,
+    words_per_page: int = 350,
+    topics: Optional[List[str]] = None,
+    seed: int = 0,
+) -> bytes:
+    """
+    Builds a text PDF of num_pages pages. The chapter walks through the
+    given topics in order (a heading where each one starts), with a running
+    header, footer and page number on every page like a real textbook scan.
+    """
+    rng = random.Random(seed)
+    topics = topics or list(TOPIC_VOCABULARY)[:4]
+    doc = fitz.open()
+
+    for page_no in range(num_pages):
+        topic = topics[min(len(topics) - 1, page_no * len(topics) // num_pages)]
+        topic_words = TOPIC_VOCABULARY.get(topic, topic.lower().split())
+        starts_topic = page_no == 0 or topic != topics[
+            min(len(topics) - 1, (page_no - 1) * len(topics) // num_pages)
+        ]
+
+        paragraphs = [topic] if starts_topic else []
+        words = 0
+        while words < words_per_page:
+            paragraph = " ".join(_sentence(rng, topic_words) for _ in range(rng.randint(3, 6)))
+            words += len(paragraph.split())
+            paragraphs.append(paragraph)
+
+        page = doc.new_page()
+        page.insert_text((50, 30), "Synthetic Textbook - Class VI", fontsize=8)
+        page.insert_textbox(fitz.Rect(50, 45, 545, 790), "\n\n".join(paragraphs), fontsize=7)
+        page.insert_text((290, 820), str(page_no + 1), fontsize=8)
+
+    data = doc.tobytes()
+    doc.close()
+    return data
@@ -0,0 +1,129 @@
+# boilerplate.py
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    BOILERPLATE_EDGE_LINES,
+    BOILERPLATE_MIN_PAGE_RATIO,
+    BOILERPLATE_MIN_PAGES,
+)
+from metrics import timed
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+# "12", "- 12 -", "(12)", "Page 12", "Page 12 of 40", "12/40"
+_PAGE_NUMBER_RE = re.compile(
+    r"^(?:page\s*)?[-–—(\[]?\s*\d{1,4}\s*(?:(?:of|/)\s*\d{1,4})?\s*[-–—)\]]?$",
+    re.IGNORECASE,
+)
+
+# Print-run stamps found on every page of school textbooks
+_STAMP_RES = [
+    re.compile(r"^reprint\s*\d{4}\s*[-–]\s*\d{2,4}$", re.IGNORECASE),
+    re.compile(r"^rationali[sz]ed\s*\d{4}\s*[-–]\s*\d{2,4}$", re.IGNORECASE),
+]
+
+# A word broken at the end of a line: letters then a hyphen (or soft hyphen)
+_BROKEN_WORD_RE = re.compile(r"[^\W\d_]{2,}[-­]$")
+
+
+def _signature(line: str) -> str:
+    """
+    Case-, space- and number-insensitive form of a line, so "Science 12"
+    and "Science 13" count as the same running header.
+    """
+    return _SPACE_RE.sub(" ", _DIGITS_RE.sub("#", line.lower())).strip()
+
+
+def _edge_positions(lines: List[str], edge: int) -> List[int]:
+    """
+    Indices of the first and last `edge` non-blank lines of a page.
+    """
+    filled = [i for i, line in enumerate(lines) if line]
+    return sorted(set(filled[:edge] + filled[-edge:])) if edge > 0 else []
+
+
+def _is_stamp(line: str) -> bool:
+    return any(pattern.match(line) for pattern in _STAMP_RES)
+
+
+def find_repeated_lines(pages: List[List[str]], edge: int = BOILERPLATE_EDGE_LINES) -> set:
+    """
+    Signatures of lines that sit at the top or bottom of many pages
+    (running headers and footers).
+    """
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    counts: Counter = Counter()
+    for lines in pages:
+        counts.update({_signature(lines[i]) for i in _edge_positions(lines, edge)})
+    threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_PAGE_RATIO * len(pages))
+    return {sig for sig, count in counts.items() if sig and count >= threshold}
+
+
+@timed("boilerplate_strip")
+def strip_page_boilerplate(
+    pages: List[str],
+    edge: int = BOILERPLATE_EDGE_LINES,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Removes running headers/footers (lines repeated at the edges of many
+    pages), page numbers, print-run stamps and hyphenated line breaks.
+    After counting the edge lines, every line is visited once; a word broken
+    across lines (or across a page break) is re-joined. Returns the cleaned
+    pages (empty ones dropped) and a report of what was removed.
+    """
+    split_pages = [page.split("\n") for page in pages]
+    repeated = find_repeated_lines(split_pages, edge)
+    report: Dict[str, Any] = {
+        "pages": len(pages),
+        "repeated_lines_removed": 0,
+        "page_numbers_removed": 0,
+        "stamps_removed": 0,
+        "hyphens_joined": 0,
+        "repeated_examples": [],
+    }
+
+    out_pages: List[List[str]] = []
+    # Where the last kept line lives, so a break can be joined across pages
+    last: Optional[Tuple[int, int]] = None
+
+    for lines in split_pages:
+        edges = set(_edge_positions(lines, edge))
+        kept: List[str] = []
+        out_pages.append(kept)
+
+        for i, line in enumerate(lines):
+            if line and i in edges:
+                # Bare page numbers also repeat by signature; count them as numbers
+                if _PAGE_NUMBER_RE.match(line):
+                    report["page_numbers_removed"] += 1
+                    continue
+                if _signature(line) in repeated:
+                    report["repeated_lines_removed"] += 1
+                    if len(report["repeated_examples"]) < 5 and line not in report["repeated_examples"]:
+                        report["repeated_examples"].append(line)
+                    continue
+            if line and _is_stamp(line):
+                report["stamps_removed"] += 1
+                continue
+
+            if line and last is not None and line[0].islower():
+                page_no, line_no = last
+                previous = out_pages[page_no][line_no]
+                if _BROKEN_WORD_RE.search(previous):
+                    out_pages[page_no][line_no] = previous[:-1] + line
+                    report["hyphens_joined"] += 1
+                    continue
+
+            if not line and (not kept or not kept[-1]):
+                # No leading or doubled blank lines once edges are gone
+                continue
+            kept.append(line)
+            if line:
+                last = (len(out_pages) - 1, len(kept) - 1)
+
+    cleaned = ["\n".join(kept).strip() for kept in out_pages]
+    return [page for page in cleaned if page], report
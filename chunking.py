@@ -1,9 +1,22 @@
 # chunking.py
-from typing import List
+import re
+import numpy as np
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
 from config import (
     WORD_COUNT_FOR_4_LESSONS,
     WORD_COUNT_FOR_5_LESSONS,
+    GROQ_TOKENS_PER_MINUTE,
+    PROMPT_TEMPLATE_TOKENS,
+    MAX_COMPLETION_TOKENS,
+    TOPIC_POSITION_WEIGHT,
 )
+from tokens import count_tokens, split_by_tokens, chunk_token_budget
+from similarity import build_vocabulary, tfidf_matrix, term_counts, normalize_rows
+from metrics import timed
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
 
 def determine_lesson_count(word_count: int) -> int:
     """
@@ -25,41 +38,282 @@ def split_text_into_paragraphs(text: str) -> List[str]:
     return paragraphs
 
 
+def split_into_sentences(text: str) -> List[str]:
+    """
+    Splits text on sentence-ending punctuation followed by whitespace.
+    """
+    return [s.strip() for s in _SENTENCE_END_RE.split(text) if s.strip()]
+
+
+def _prefix_sums(weights: List[int]) -> List[int]:
+    prefix = [0] * (len(weights) + 1)
+    for i, w in enumerate(weights):
+        prefix[i + 1] = prefix[i] + w
+    return prefix
+
+
+def _groups_needed(prefix: List[int], start: int, max_weight: int) -> int:
+    """
+    Fewest contiguous groups covering units[start:] with each group <= max_weight.
+    Each step jumps to the farthest feasible end via binary search on the prefix sums.
+    """
+    n = len(prefix) - 1
+    groups = 0
+    while start < n:
+        start = bisect_right(prefix, prefix[start] + max_weight, start + 1) - 1
+        groups += 1
+    return groups
+
+
+def _balanced_groups(weights: List[int], num_groups: int) -> List[Tuple[int, int]]:
+    """
+    Partitions consecutive units into min(num_groups, len(weights)) non-empty
+    spans, minimising the heaviest span (binary search on the maximum over
+    prefix sums). Among optimal partitions, each cut is placed as close as
+    possible to an even share of the remaining weight.
+    Returns (start, end) index spans.
+    """
+    n = len(weights)
+    num_groups = min(num_groups, n)
+    if num_groups <= 0:
+        return []
+
+    prefix = _prefix_sums(weights)
+
+    # -------- SMALLEST FEASIBLE MAXIMUM --------
+    low, high = max(weights), prefix[n]
+    while low < high:
+        mid = (low + high) // 2
+        if _groups_needed(prefix, 0, mid) <= num_groups:
+            high = mid
+        else:
+            low = mid + 1
+    max_weight = low
+
+    # -------- PLACE CUTS --------
+    spans = []
+    start = 0
+    for groups_left in range(num_groups, 1, -1):
+        # Farthest end that respects max_weight and leaves one unit per later group
+        farthest = min(
+            bisect_right(prefix, prefix[start] + max_weight, start + 1) - 1,
+            n - (groups_left - 1),
+        )
+        ideal = prefix[start] + (prefix[n] - prefix[start]) / groups_left
+        near = bisect_left(prefix, ideal, start + 1, farthest + 1)
+
+        end = farthest
+        for candidate in sorted(
+            {min(max(c, start + 1), farthest) for c in (near - 1, near)},
+            key=lambda c: abs(prefix[c] - ideal),
+        ):
+            if _groups_needed(prefix, candidate, max_weight) <= groups_left - 1:
+                end = candidate
+                break
+
+        spans.append((start, end))
+        start = end
+    spans.append((start, n))
+
+    return spans
+
+
+@timed("chunk_words")
 def split_into_lesson_chunks(text: str, num_lessons: int) -> List[str]:
     """
     Splits text into num_lessons chunks, keeping paragraphs intact.
-    Approximate equal total word count per chunk.
+    Chunks are contiguous and the largest chunk (in words) is as small as possible.
+    Never returns empty chunks: short texts fall back to sentence units and,
+    failing that, yield fewer than num_lessons chunks.
     """
-    paragraphs = split_text_into_paragraphs(text)
-    if not paragraphs:
-        return [text]
+    units = split_text_into_paragraphs(text)
+    joiner = "\n\n"
+    if len(units) < num_lessons:
+        sentences = split_into_sentences(text)
+        if len(sentences) > len(units):
+            units, joiner = sentences, " "
 
-    total_words = sum(len(p.split()) for p in paragraphs)
-    target_words_per_chunk = max(1, total_words // num_lessons)
+    word_counts = [max(1, len(u.split())) for u in units]
+    return [
+        joiner.join(units[start:end])
+        for start, end in _balanced_groups(word_counts, num_lessons)
+    ]
 
-    chunks = []
-    current_chunk = []
-    current_count = 0
-    remaining_chunks = num_lessons
-
-    for i, p in enumerate(paragraphs):
-        p_words = len(p.split())
-        # If adding this paragraph would exceed target and we still have chunks left,
-        # start a new chunk
-        if (current_count + p_words > target_words_per_chunk) and (remaining_chunks > 1):
-            chunks.append("\n\n".join(current_chunk).strip())
-            remaining_chunks -= 1
-            current_chunk = [p]
-            current_count = p_words
+
+# -------- TOKEN-BASED CHUNKING --------
+def _split_oversized_paragraph(paragraph: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """
+    Packs the sentences of a paragraph into pieces of at most max_tokens.
+    A single sentence over the budget is cut into token windows.
+    """
+    sentences = []
+    for sentence in split_into_sentences(paragraph):
+        if count_tokens(sentence, model) > max_tokens:
+            sentences.extend(split_by_tokens(sentence, max_tokens, model))
+        else:
+            sentences.append(sentence)
+
+    pieces = []
+    current = []
+    current_tokens = 0
+    for sentence in sentences:
+        sentence_tokens = count_tokens(sentence, model)
+        if current and current_tokens + sentence_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+            current_tokens = 0
+        current.append(sentence)
+        current_tokens += sentence_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+@timed("chunk_tokens")
+def plan_token_chunks(
+    text: str,
+    num_lessons: int,
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Splits text into num_lessons chunks balanced by token count, each kept
+    within the per-request token budget. Paragraphs larger than the budget
+    are split on sentence boundaries. Chunks are never empty, so a short
+    text may yield fewer than num_lessons chunks. If the text cannot fit in
+    num_lessons * budget, trailing paragraphs of an over-budget chunk are
+    dropped and reported as dropped_tokens.
+
+    Returns {"chunks", "chunk_tokens", "token_budget", "total_tokens",
+    "dropped_tokens", "estimated_minutes"} so throughput can be planned
+    before any request is sent.
+    """
+    budget = max_tokens or chunk_token_budget(model)
+
+    units = []
+    unit_tokens = []
+    for paragraph in split_text_into_paragraphs(text):
+        tokens = count_tokens(paragraph, model)
+        if tokens > budget:
+            for piece in _split_oversized_paragraph(paragraph, budget, model):
+                units.append(piece)
+                unit_tokens.append(count_tokens(piece, model))
         else:
-            current_chunk.append(p)
-            current_count += p_words
+            units.append(paragraph)
+            unit_tokens.append(tokens)
+
+    chunks = []
+    chunk_tokens = []
+    dropped_tokens = 0
+    for start, end in _balanced_groups(unit_tokens, num_lessons):
+        kept = []
+        kept_tokens = 0
+        for i in range(start, end):
+            if kept and kept_tokens + unit_tokens[i] > budget:
+                dropped_tokens += sum(unit_tokens[i:end])
+                break
+            kept.append(units[i])
+            kept_tokens += unit_tokens[i]
+        chunk = "\n\n".join(kept)
+        chunks.append(chunk)
+        chunk_tokens.append(count_tokens(chunk, model))
 
-    if current_chunk:
-        chunks.append("\n\n".join(current_chunk).strip())
+    request_tokens = sum(chunk_tokens) + len(chunks) * (PROMPT_TEMPLATE_TOKENS + MAX_COMPLETION_TOKENS)
+    return {
+        "chunks": chunks,
+        "chunk_tokens": chunk_tokens,
+        "token_budget": budget,
+        "total_tokens": sum(unit_tokens),
+        "dropped_tokens": dropped_tokens,
+        "estimated_minutes": request_tokens / GROQ_TOKENS_PER_MINUTE,
+    }
 
-    # If for some reason we have fewer chunks than requested, pad last ones
-    while len(chunks) < num_lessons:
-        chunks.append("")
 
-    return chunks
+def split_into_token_chunks(
+    text: str,
+    num_lessons: int,
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+) -> List[str]:
+    return plan_token_chunks(text, num_lessons, model, max_tokens)["chunks"]
+
+
+# -------- TOPIC-ALIGNED CHUNKING --------
+def _topic_alignment_scores(units: List[str], topic_names: List[str]) -> np.ndarray:
+    """
+    (units x topics) score matrix: TF-IDF cosine similarity over the topic
+    vocabulary (idf from the units, scaled per topic) plus a positional prior
+    that favours topics following the text in order.
+    """
+    vocabulary = build_vocabulary(topic_names)
+    num_units, num_topics = len(units), len(topic_names)
+
+    if vocabulary:
+        unit_matrix, idf, _ = tfidf_matrix(units, vocabulary)
+        topic_matrix = normalize_rows(np.log1p(term_counts(topic_names, vocabulary)) * idf)
+        similarity = unit_matrix @ topic_matrix.T
+        column_max = similarity.max(axis=0)
+        similarity = similarity / np.where(column_max == 0.0, 1.0, column_max)
+    else:
+        similarity = np.zeros((num_units, num_topics))
+
+    unit_pos = (np.arange(num_units) + 0.5) / num_units
+    topic_centre = (np.arange(num_topics) + 0.5) / num_topics
+    prior = 1.0 - np.minimum(1.0, np.abs(unit_pos[:, None] - topic_centre[None, :]) * num_topics)
+
+    return similarity + TOPIC_POSITION_WEIGHT * prior
+
+
+def _align_spans(scores: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Splits units into one non-empty contiguous span per topic (in topic order)
+    maximising the summed unit/topic scores. O(units x topics) dynamic
+    programme, vectorised over units with running maxima.
+    """
+    num_units, num_topics = scores.shape
+    cumulative = np.vstack([np.zeros((1, num_topics)), np.cumsum(scores, axis=0)])
+    positions = np.arange(num_units + 1)
+
+    # best[p] = best score covering units[:p] with the topics handled so far
+    best = np.full(num_units + 1, -np.inf)
+    best[0] = 0.0
+    back = np.zeros((num_topics, num_units + 1), dtype=np.int64)
+
+    for t in range(num_topics):
+        gain = best - cumulative[:, t]
+        running_max = np.maximum.accumulate(gain)
+        running_arg = np.maximum.accumulate(np.where(gain == running_max, positions, 0))
+
+        current = np.full(num_units + 1, -np.inf)
+        current[1:] = cumulative[1:, t] + running_max[:-1]
+        back[t, 1:] = running_arg[:-1]
+        # Topic t needs t earlier non-empty spans plus at least one unit of its own
+        current[:t + 1] = -np.inf
+        best = current
+
+    spans = []
+    end = num_units
+    for t in range(num_topics - 1, -1, -1):
+        start = int(back[t, end])
+        spans.append((start, end))
+        end = start
+    return spans[::-1]
+
+
+@timed("chunk_topics")
+def split_into_topic_chunks(text: str, topic_names: List[str]) -> List[str]:
+    """
+    Splits text into one contiguous chunk per topic, placing each cut where
+    the paragraphs best match their topic name lexically instead of at
+    equal-size boundaries. Falls back to sentence units for short texts and
+    to split_into_lesson_chunks when there is still less text than topics.
+    """
+    units = split_text_into_paragraphs(text)
+    joiner = "\n\n"
+    if len(units) < len(topic_names):
+        units, joiner = split_into_sentences(text), " "
+    if len(units) < len(topic_names) or not topic_names:
+        return split_into_lesson_chunks(text, len(topic_names) or 1)
+
+    spans = _align_spans(_topic_alignment_scores(units, topic_names))
+    return [joiner.join(units[start:end]) for start, end in spans]
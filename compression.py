@@ -0,0 +1,97 @@
+# compression.py
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chunking import split_text_into_paragraphs, split_into_sentences
+from config import COMPRESSION_TOPIC_WEIGHT
+from similarity import tfidf_matrix, term_counts, normalize_rows
+from tokens import count_tokens
+
+
+def score_sentences(
+    sentences: List[str],
+    topic_name: str,
+    topic_weight: float = COMPRESSION_TOPIC_WEIGHT,
+) -> np.ndarray:
+    """
+    Importance of each sentence: TF-IDF cosine similarity to the chunk's
+    centroid (centrality) plus topic_weight times its similarity to the
+    topic name, both scaled to [0, 1].
+    """
+    matrix, idf, vocabulary = tfidf_matrix(sentences)
+    centrality = matrix @ matrix.mean(axis=0)
+    scores = centrality / max(float(centrality.max()), 1e-12)
+
+    # Topic terms that never occur in the chunk carry no signal
+    topic_vector = np.log1p(term_counts([topic_name], vocabulary)) * idf
+    if topic_weight and topic_vector.any():
+        overlap = matrix @ normalize_rows(topic_vector)[0]
+        scores = scores + topic_weight * overlap / max(float(overlap.max()), 1e-12)
+    return scores
+
+
+def compress_text(
+    text: str,
+    topic_name: str,
+    target_tokens: int,
+    model: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extractive compression: keeps the highest-scoring sentences (see
+    score_sentences) that fit in target_tokens, in their original order and
+    paragraphs. Text already within the target is returned unchanged.
+    Returns (text, {"tokens_before", "tokens_after", "sentences_before",
+    "sentences_kept"}).
+    """
+    tokens_before = count_tokens(text, model)
+    stats: Dict[str, Any] = {"tokens_before": tokens_before, "tokens_after": tokens_before}
+    if target_tokens <= 0 or tokens_before <= target_tokens:
+        return text, stats
+
+    # (paragraph index, sentence) so kept sentences can be regrouped
+    units = [
+        (p, sentence)
+        for p, paragraph in enumerate(split_text_into_paragraphs(text))
+        for sentence in split_into_sentences(paragraph)
+    ]
+    sentences = [sentence for _, sentence in units]
+    sentence_tokens = [count_tokens(sentence, model) for sentence in sentences]
+    scores = score_sentences(sentences, topic_name)
+
+    # Best first; a sentence that does not fit is skipped so shorter ones can still be kept
+    kept = set()
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if used + sentence_tokens[i] <= target_tokens or not kept:
+            kept.add(int(i))
+            used += sentence_tokens[i]
+
+    paragraphs: Dict[int, List[str]] = {}
+    for i in sorted(kept):
+        p, sentence = units[i]
+        paragraphs.setdefault(p, []).append(sentence)
+    compressed = "\n\n".join(" ".join(parts) for _, parts in sorted(paragraphs.items()))
+
+    stats.update({
+        "tokens_after": count_tokens(compressed, model),
+        "sentences_before": len(sentences),
+        "sentences_kept": len(kept),
+    })
+    return compressed, stats
+
+
+def summarize_compression(lesson_stats: List[Dict[str, Any]], target_tokens: int) -> Dict[str, Any]:
+    """
+    Run-level totals of the per-lesson "compression" stats.
+    """
+    compressed = [s["compression"] for s in lesson_stats if "compression" in s]
+    tokens_before = sum(c["tokens_before"] for c in compressed)
+    tokens_after = sum(c["tokens_after"] for c in compressed)
+    return {
+        "target_tokens": target_tokens,
+        "lessons_compressed": sum(1 for c in compressed if c["tokens_after"] < c["tokens_before"]),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
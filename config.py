@@ -5,7 +5,15 @@ import os
 # LLM CONFIG
 # -----------------------------
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_MODEL = "openai/gpt-oss-safeguard-20b"
+GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-safeguard-20b")
+# Any OpenAI-compatible endpoint speaking the Groq API (e.g. a local mock); None = Groq
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+# More Groq keys (comma-separated), pooled with GROQ_API_KEY for extra throughput
+GROQ_API_KEYS = os.getenv("GROQ_API_KEYS", "")
+# Optional JSON list of OpenAI-compatible backends; replaces the Groq keys above, e.g.
+# [{"name": "groq-a", "api_key_env": "GROQ_KEY_A", "weight": 2},
+#  {"name": "backup", "base_url": "https://example.com/v1", "api_key_env": "BACKUP_KEY", "model": "..."}]
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "")
 
 
 # -----------------------------
@@ -37,3 +45,169 @@ MAX_LESSON_DURATION_MIN = 50
 # Chunking thresholds (word count)
 WORD_COUNT_FOR_4_LESSONS = 2500
 WORD_COUNT_FOR_5_LESSONS = 4000
+
+# -----------------------------
+# GENERATION CONCURRENCY
+# -----------------------------
+# Max lessons sent to the LLM in parallel (1 = sequential)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# -----------------------------
+# LLM RESPONSE CACHE
+# -----------------------------
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+LLM_CACHE_MAX_AGE_SECONDS = int(os.getenv("LLM_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+# -----------------------------
+# PDF PREPROCESSING CACHE (in-memory, per process)
+# -----------------------------
+PREPROCESS_TEXT_CACHE_SIZE = int(os.getenv("PREPROCESS_TEXT_CACHE_SIZE", "16"))
+PREPROCESS_CHUNK_CACHE_SIZE = int(os.getenv("PREPROCESS_CHUNK_CACHE_SIZE", "64"))
+# Threads that extract and chunk uploaded PDFs ahead of generation
+PREPROCESS_PREFETCH_WORKERS = int(os.getenv("PREPROCESS_PREFETCH_WORKERS", "2"))
+
+# -----------------------------
+# PDF EXTRACTION
+# -----------------------------
+# Process-pool size for page-range extraction (1 = single process)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many pages the process pool start-up (~0.5s to spawn workers that
+# re-import PyMuPDF) costs more than it saves; single-process runs ~1000 pages/s
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "800"))
+
+# -----------------------------
+# BOILERPLATE STRIPPING (page headers/footers, page numbers, hyphenation)
+# -----------------------------
+BOILERPLATE_STRIPPING = os.getenv("BOILERPLATE_STRIPPING", "1") == "1"
+# How many lines at the top and bottom of each page can be a header/footer
+BOILERPLATE_EDGE_LINES = int(os.getenv("BOILERPLATE_EDGE_LINES", "3"))
+# A line is boilerplate when it repeats on this share of pages (and at least
+# BOILERPLATE_MIN_PAGES pages); shorter documents are left alone
+BOILERPLATE_MIN_PAGE_RATIO = float(os.getenv("BOILERPLATE_MIN_PAGE_RATIO", "0.5"))
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+
+# -----------------------------
+# LESSON TEXT COMPRESSION (extractive)
+# -----------------------------
+# Lesson-text tokens sent per lesson; longer chunks keep only their most central
+# and on-topic sentences (0 = always send the whole chunk). Overridable per run.
+LESSON_COMPRESSION_TARGET_TOKENS = int(os.getenv("LESSON_COMPRESSION_TARGET_TOKENS", "0"))
+# Weight of topic-name overlap relative to TF-IDF centrality when ranking sentences
+COMPRESSION_TOPIC_WEIGHT = float(os.getenv("COMPRESSION_TOPIC_WEIGHT", "0.5"))
+
+# -----------------------------
+# TOKEN BUDGETS
+# -----------------------------
+# "words" balances chunks by word count, "tokens" by tokenizer count within a budget,
+# "topics" aligns one chunk per topic name by lexical similarity
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "words")
+
+# Used when tiktoken has no mapping for the model name
+TOKENIZER_FALLBACK_ENCODING = "o200k_base"
+
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-safeguard-20b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "openai/gpt-oss-120b": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama-3.1-8b-instant": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Account tokens-per-minute quota; a single request must fit inside it
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "8000"))
+
+# Reserved per request on top of the lesson text
+PROMPT_TEMPLATE_TOKENS = 300
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "4096"))
+
+# -----------------------------
+# TOPIC-ALIGNED CHUNKING
+# -----------------------------
+# Weight of the "topics follow the text order" prior vs lexical similarity
+TOPIC_POSITION_WEIGHT = float(os.getenv("TOPIC_POSITION_WEIGHT", "0.35"))
+
+# -----------------------------
+# LLM CONNECTION, RETRIES & CIRCUIT BREAKER
+# -----------------------------
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+# Shared HTTP connection pool for the process-wide client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# Consecutive failures before failing fast, and how long to stay open
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# -----------------------------
+# RATE LIMITER (one per provider key)
+# -----------------------------
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "1") == "1"
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+# Completion size assumed when reserving tokens before the reply is known
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("EXPECTED_COMPLETION_TOKENS", "1500"))
+
+# -----------------------------
+# STRUCTURED OUTPUT
+# -----------------------------
+# "json_schema" (schema built from the enabled sections), "json_object" or "off".
+# Opt-in: providers reject response_format on streamed requests, so structured
+# replies arrive whole instead of section by section.
+LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "off")
+# Extra attempts when a reply is off-schema or not valid JSON
+LLM_SCHEMA_RETRIES = int(os.getenv("LLM_SCHEMA_RETRIES", "2"))
+
+# -----------------------------
+# MULTI-LESSON BATCHING
+# -----------------------------
+# Pack several lessons into one request (size chosen from the token budget)
+LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "0") == "1"
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "6"))
+
+# -----------------------------
+# BACKGROUND JOBS
+# -----------------------------
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+# Chapters generated at the same time across all sessions
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# How often the UI re-reads a running job's progress
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+# Finished jobs (and their stored PDFs) are deleted after this long
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# -----------------------------
+# WORD / ZIP EXPORT
+# -----------------------------
+# Rendered chapters kept in memory (keyed by a hash of the lesson plans)
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "8"))
+# Threads rendering exports in the background
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))
+
+# -----------------------------
+# METRICS
+# -----------------------------
+# Port for the /metrics (Prometheus) and /metrics.json endpoint; 0 = off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# -----------------------------
+# HEDGED REQUESTS & DEADLINES
+# -----------------------------
+# Send a duplicate request when the first runs past the observed latency percentile
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+# Never hedge sooner than this; until enough latencies are seen use the initial delay
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1.0"))
+LLM_HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "20"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# At most this fraction of requests get a hedge (caps the extra spend)
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+# Latency budget per lesson, covering retries and hedges but not time queued
+# behind the rate limiter (0 = no limit)
+LLM_LESSON_DEADLINE_SECONDS = float(os.getenv("LLM_LESSON_DEADLINE_SECONDS", "180"))
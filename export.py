@@ -0,0 +1,188 @@
+# export.py
+import hashlib
+import io
+import json
+import re
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from docx import Document
+
+from config import EXPORT_CACHE_SIZE, EXPORT_WORKERS
+from lesson_schema import SYSTEM_FIELDS
+from metrics import registry, timed
+from lru_cache import LRUCache
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MIME = "application/zip"
+
+
+def result_digest(lesson_plans: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(lesson_plans, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _slug(text: Any, fallback: str) -> str:
+    slug = re.sub(r"[^\w]+", "_", str(text or "")).strip("_")
+    return slug[:60] or fallback
+
+
+def lesson_filename(lesson: Dict[str, Any]) -> str:
+    n = lesson.get("lesson_plan_no", 0)
+    return f"Lesson_{n:02d}_{_slug(lesson.get('topic_name'), 'Untitled')}.docx"
+
+
+def exportable_lessons(lesson_plans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Lesson plans that were generated; failed lessons (placeholders with an
+    "error" key) are left out of every export.
+    """
+    return [lp for lp in lesson_plans if "error" not in lp]
+
+
+def chapter_filename(lesson_plans: List[Dict[str, Any]], fallback: str = "Lesson_Plans") -> str:
+    chapter = lesson_plans[0].get("chapter_name") if lesson_plans else None
+    return _slug(chapter, fallback)
+
+
+# -------- DOCX RENDERING --------
+def _add_value(doc, value: Any) -> None:
+    if isinstance(value, list):
+        for item in value:
+            doc.add_paragraph(str(item), style="List Bullet")
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            doc.add_paragraph(f"{str(k).replace('_', ' ').title()}: {v}", style="List Bullet")
+    else:
+        doc.add_paragraph(str(value))
+
+
+@timed("export_docx")
+def render_lesson_docx(lesson: Dict[str, Any]) -> bytes:
+    """
+    One lesson plan as a Word document: title, the system fields as a
+    header block, then each content section in display order.
+    """
+    doc = Document()
+    doc.add_heading(f"Lesson Plan {lesson.get('lesson_plan_no', '')}: {lesson.get('topic_name', '')}", level=1)
+    for key in ("grade", "chapter_name", "page_no"):
+        if lesson.get(key):
+            doc.add_paragraph(f"{key.replace('_', ' ').title()}: {lesson[key]}")
+
+    for key, value in lesson.items():
+        if key in SYSTEM_FIELDS:
+            continue
+        doc.add_heading(key.replace("_", " ").title(), level=2)
+        _add_value(doc, value)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+# -------- CACHED CHAPTER EXPORT (shared by every Streamlit session) --------
+_export_cache = LRUCache(EXPORT_CACHE_SIZE)
+_export_executor: Optional[ThreadPoolExecutor] = None
+_export_lock = threading.Lock()
+
+
+@timed("export_chapter")
+def _render_chapter(lesson_plans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    folder = chapter_filename(lesson_plans)
+    lessons = {
+        lp["lesson_plan_no"]: (lesson_filename(lp), render_lesson_docx(lp))
+        for lp in exportable_lessons(lesson_plans)
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in lessons.values():
+            zf.writestr(f"{folder}/{name}", data)
+    return {
+        "filename": f"{folder}.zip",
+        "zip": buffer.getvalue(),
+        "lessons": lessons,
+        "skipped": [lp["lesson_plan_no"] for lp in lesson_plans if "error" in lp],
+    }
+
+
+def export_chapter(lesson_plans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Word files for every generated lesson plus the chapter ZIP:
+      {"filename": "<chapter>.zip", "zip": bytes,
+       "lessons": {lesson_plan_no: (filename, bytes)}, "skipped": [failed lesson_plan_no, ...]}
+    Cached by a hash of the lesson plans, so reruns and repeated downloads
+    (from any session) reuse the rendered bytes.
+    """
+    def render() -> Dict[str, Any]:
+        registry.inc("lessonplan_export_renders_total")
+        return _render_chapter(lesson_plans)
+
+    return _export_cache.get_or_compute(result_digest(lesson_plans), render)
+
+
+def submit_export(lesson_plans: List[Dict[str, Any]]) -> "Future[Dict[str, Any]]":
+    """
+    Runs export_chapter on a shared background thread, so rendering never
+    blocks a UI run.
+    """
+    global _export_executor
+    with _export_lock:
+        if _export_executor is None:
+            _export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    return _export_executor.submit(export_chapter, lesson_plans)
+
+
+# -------- STREAMED MULTI-CHAPTER ZIP --------
+class _ChunkSink:
+    """
+    Write-only, non-seekable file object that collects what zipfile writes
+    so it can be handed out in pieces.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip_chunks(chapters: Iterable[Tuple[str, List[Dict[str, Any]]]]) -> Iterator[bytes]:
+    """
+    ZIP of many chapters, one folder each, yielded piece by piece: each
+    lesson is rendered, compressed and yielded before the next one, so
+    only one document is in memory at a time. chapters yields
+    (folder name, lesson_plans) and may itself be lazy. Failed lessons are
+    left out.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for folder, lesson_plans in chapters:
+            for lesson in exportable_lessons(lesson_plans):
+                zf.writestr(f"{_slug(folder, 'Chapter')}/{lesson_filename(lesson)}", render_lesson_docx(lesson))
+                data = sink.drain()
+                if data:
+                    yield data
+    # Central directory, written on close
+    yield sink.drain()
+
+
+def write_zip(chapters: Iterable[Tuple[str, List[Dict[str, Any]]]], fileobj: BinaryIO) -> int:
+    """
+    Streams iter_zip_chunks into fileobj; returns the bytes written.
+    """
+    written = 0
+    for data in iter_zip_chunks(chapters):
+        fileobj.write(data)
+        written += len(data)
+    return written
@@ -1,11 +1,280 @@
 # generator.py
-from typing import List, Dict, Any, Optional
-from pdf_utils import extract_text_from_pdf, rough_word_count
-from chunking import determine_lesson_count, split_into_lesson_chunks
-from llm_client import LessonPlanLLMClient
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterator
+from chunking import determine_lesson_count
+from compression import compress_text, summarize_compression
+from pdf_utils import resolve_page_selection
+from preprocess_cache import file_digest, get_document_text, get_chunk_plan
+from llm_client import LessonPlanLLMClient, build_sections, finalize_lesson
+from incremental import lesson_fingerprint, plan_lesson_update, merge_lesson
+from lesson_schema import SYSTEM_FIELDS
+from llm_providers import get_provider_pool
+from tokens import count_tokens, plan_lesson_batches
+from metrics import registry, span
+from config import (
+    LLM_MAX_CONCURRENCY,
+    CHUNKING_MODE,
+    LLM_BATCH_MODE,
+    LLM_RATE_LIMIT_ENABLED,
+    LESSON_COMPRESSION_TARGET_TOKENS,
+    PREPROCESS_PREFETCH_WORKERS,
+)
 
+# How often the caller thread checks for finished lessons / queue position
+QUEUE_POLL_SECONDS = 0.5
 
-def generate_lesson_plans_from_pdf(
+
+class _LessonBatches:
+    """
+    Runs each multi-lesson batch once, on whichever lesson worker asks for
+    it first; the batch's other lessons wait for and reuse that reply.
+    """
+
+    def __init__(
+        self,
+        batches: List[List[int]],
+        run_batch: Callable[[List[int]], Dict[int, Dict[str, Any]]],
+    ):
+        self._batches = batches
+        self._run_batch = run_batch
+        self._batch_of = {i: b for b, indices in enumerate(batches) for i in indices}
+        self._locks = [threading.Lock() for _ in batches]
+        self._results: Dict[int, Dict[int, Dict[str, Any]]] = {}
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        """
+        The lesson plan for chunk index from its batch reply, or None if it
+        has to be generated on its own (missing, off-schema or batch failed).
+        """
+        b = self._batch_of[index]
+        if len(self._batches[b]) < 2:
+            return None
+        with self._locks[b]:
+            if b not in self._results:
+                try:
+                    self._results[b] = self._run_batch(self._batches[b])
+                except Exception:
+                    self._results[b] = {}
+        return self._results[b].get(index + 1)
+
+
+def _iter_lesson_events(
+    generate_one: Callable[[int, Callable[[Dict[str, Any]], None]], Dict[str, Any]],
+    num_chunks: int,
+    max_concurrency: int,
+    session_id: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Runs generate_one(i, emit) for every chunk index, up to max_concurrency at
+    once, and yields events on the calling thread as they happen:
+      - whatever the workers pass to emit (e.g. {"type": "section", ...})
+      - {"type": "lesson", "index", "lesson" | "error", "completed", "total"}
+        when a lesson finishes; a failing lesson never cancels the others
+      - {"type": "queue", "position", ...} while this session is waiting on
+        a provider's rate limiter
+    """
+    events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+    providers = get_provider_pool() if LLM_RATE_LIMIT_ENABLED else None
+    completed = 0
+    last_queue_check = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, num_chunks))) as pool:
+        for i in range(num_chunks):
+            future = pool.submit(generate_one, i, events.put)
+            future.add_done_callback(
+                lambda f, i=i: events.put({"type": "_done", "index": i, "future": f})
+            )
+
+        while completed < num_chunks:
+            try:
+                event = events.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                event = None
+
+            if event is not None and event["type"] == "_done":
+                completed += 1
+                i = event["index"]
+                try:
+                    outcome = {"index": i, "lesson": event["future"].result()}
+                except Exception as e:
+                    outcome = {"index": i, "error": f"{type(e).__name__}: {e}"}
+                yield dict(outcome, type="lesson", completed=completed, total=num_chunks)
+            elif event is not None:
+                yield event
+
+            now = time.monotonic()
+            if providers is not None and session_id and now - last_queue_check >= QUEUE_POLL_SECONDS:
+                last_queue_check = now
+                queue_info = providers.snapshot(session_id)
+                if queue_info.get("position"):
+                    yield dict(queue_info, type="queue")
+
+
+def _lesson_outcome(event: Dict[str, Any], stats: Dict[str, Any]) -> str:
+    if "error" in event:
+        return "error"
+    if stats.get("resumed"):
+        return "resumed"
+    if stats.get("regeneration") in ("reuse", "update"):
+        return "reused" if stats["regeneration"] == "reuse" else "updated"
+    if stats.get("cache_hit") or stats.get("batch", {}).get("cache_hit"):
+        return "cached"
+    return "generated"
+
+
+def summarize_usage(lesson_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run totals from per-lesson stats: tokens, retries, cache hits, hedging
+    and deadlines, and the summed seconds per LLM stage. A shared batch
+    request is counted once.
+    """
+    totals: Dict[str, Any] = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "retries": 0,
+        "cache_hits": 0,
+        "attempts": 0,
+        "hedges": 0,
+        "hedge_wins": 0,
+        "hedge_saved_s": 0.0,
+        "deadline_exceeded": 0,
+        "timings": {},
+    }
+    seen_batches = set()
+    for stats in lesson_stats:
+        sources = [stats]
+        batch = stats.get("batch")
+        if batch is not None and id(batch) not in seen_batches:
+            seen_batches.add(id(batch))
+            sources.append(batch)
+        for source in sources:
+            totals["prompt_tokens"] += source.get("prompt_tokens", 0)
+            totals["completion_tokens"] += source.get("completion_tokens", 0)
+            totals["retries"] += source.get("retries", 0)
+            totals["cache_hits"] += 1 if source.get("cache_hit") else 0
+            totals["attempts"] += source.get("attempts", 0)
+            totals["hedges"] += source.get("hedged", 0)
+            totals["hedge_wins"] += source.get("hedge_won", 0)
+            totals["hedge_saved_s"] += source.get("hedge_saved_s", 0.0)
+            totals["deadline_exceeded"] += 1 if source.get("deadline_exceeded") else 0
+            for stage, seconds in source.get("timings", {}).items():
+                totals["timings"][stage] = totals["timings"].get(stage, 0.0) + seconds
+    totals["hedge_rate"] = totals["hedges"] / totals["attempts"] if totals["attempts"] else 0.0
+    return totals
+
+
+def plan_lesson_chunks(
+    file_bytes: bytes,
+    page_no: str,
+    override_num_lessons: Optional[int],
+    chunking_mode: Optional[str] = None,
+    topic_names: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Everything that happens before the first LLM call: page selection,
+    extraction, lesson count and chunking (all cached by file hash).
+    In "tokens" mode the plan also reports per-chunk token counts; in
+    "topics" mode there is one chunk per topic name, aligned by content.
+    plan["timings"] holds the seconds spent per stage (near zero when cached);
+    plan["cleanup"] reports the words/tokens removed as page boilerplate;
+    plan["page_warning"] is set when page_no named pages outside the
+    document (see resolve_page_selection).
+    """
+    # Only the requested pages are extracted; lesson count and chunks follow that text
+    page_ranges, page_warning = resolve_page_selection(file_bytes, page_no)
+
+    # Extraction and chunking are cached by file hash across reruns/sessions
+    timings: Dict[str, float] = {}
+    digest = file_digest(file_bytes)
+    with span("preprocess_text", timings):
+        doc = get_document_text(file_bytes, page_ranges, digest)
+
+    if (chunking_mode or CHUNKING_MODE) == "topics" and topic_names:
+        num_lessons = len(topic_names)
+    else:
+        num_lessons = override_num_lessons or determine_lesson_count(doc["word_count"])
+    with span("chunk_plan", timings):
+        plan = get_chunk_plan(
+            file_bytes, num_lessons, page_ranges, digest, chunking_mode, topic_names
+        )
+    if not plan["chunks"]:
+        raise ValueError("No text could be extracted from the selected pages")
+
+    # Chunks are never empty, so very short texts can produce fewer lessons
+    plan.update({
+        "document_digest": digest,
+        "word_count": doc["word_count"],
+        "num_lessons": len(plan["chunks"]),
+        "cleanup": doc.get("cleanup"),
+        "page_warning": page_warning,
+        "timings": timings,
+    })
+    return plan
+
+
+# -------- SPECULATIVE PREPROCESSING --------
+def preview_lesson_chunks(
+    file_bytes: bytes,
+    page_no: str,
+    override_num_lessons: Optional[int] = None,
+    chunking_mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    The part of plan_lesson_chunks that does not need topic names: word
+    count, lesson count and (except in "topics" mode, where chunks follow
+    the topic names) the chunks. Fills the same caches, so generation
+    started later reuses the work.
+    """
+    if (chunking_mode or CHUNKING_MODE) != "topics":
+        return plan_lesson_chunks(file_bytes, page_no, override_num_lessons, chunking_mode)
+
+    timings: Dict[str, float] = {}
+    page_ranges, page_warning = resolve_page_selection(file_bytes, page_no)
+    with span("preprocess_text", timings):
+        doc = get_document_text(file_bytes, page_ranges)
+    return {
+        "chunks": None,
+        "mode": "topics",
+        "document_digest": doc["digest"],
+        "word_count": doc["word_count"],
+        "num_lessons": override_num_lessons or determine_lesson_count(doc["word_count"]),
+        "cleanup": doc.get("cleanup"),
+        "page_warning": page_warning,
+        "timings": timings,
+    }
+
+
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_lock = threading.Lock()
+
+
+def prefetch_lesson_chunks(
+    file_bytes: bytes,
+    page_no: str,
+    override_num_lessons: Optional[int] = None,
+    chunking_mode: Optional[str] = None,
+) -> "Future[Dict[str, Any]]":
+    """
+    Runs preview_lesson_chunks on a shared background thread, e.g. as soon
+    as a PDF is uploaded, so extraction and chunking are off the critical
+    path by the time generation starts.
+    """
+    global _prefetch_executor
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=PREPROCESS_PREFETCH_WORKERS, thread_name_prefix="prefetch"
+            )
+    return _prefetch_executor.submit(
+        preview_lesson_chunks, file_bytes, page_no, override_num_lessons, chunking_mode
+    )
+
+
+def stream_lesson_plans_from_pdf(
     file_bytes: bytes,
     grade: str,
     chapter_name: str,
@@ -21,20 +290,215 @@ def generate_lesson_plans_from_pdf(
     include_strategy: bool,
     include_interdisciplinary: bool,
     include_extended: bool,
-) -> Dict[str, Any]:
-
-    text = extract_text_from_pdf(file_bytes)
-    wc = rough_word_count(text)
+    max_concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    chunking_mode: Optional[str] = None,
+    session_id: str = "default",
+    stream_sections: bool = True,
+    batch_mode: Optional[bool] = None,
+    completed_lessons: Optional[Dict[int, Dict[str, Any]]] = None,
+    compress_tokens: Optional[int] = None,
+    previous_result: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generates lesson plans, yielding progress events on the calling thread:
+      {"type": "plan", "num_lessons", "topic_names"} once chunking is done,
+      {"type": "section", "lesson_plan_no", "key", "value"} as each section of
+        a lesson streams in (only with stream_sections),
+      {"type": "sections_reset", "lesson_plan_no"} when the sections streamed
+        so far for that lesson are withdrawn (its request was retried),
+      {"type": "lesson", ...} and {"type": "queue", ...} (see _iter_lesson_events),
+      {"type": "result", "result"} last, with the same dict that
+        generate_lesson_plans_from_pdf returns.
+    batch_mode packs consecutive lessons into shared requests sized by the
+    token budget; lessons missing from a batched reply are generated singly.
+    completed_lessons ({lesson_plan_no: plan}, e.g. from a checkpoint) are
+    returned as-is without calling the LLM.
+    compress_tokens (default LESSON_COMPRESSION_TARGET_TOKENS, 0 = off) caps
+    the lesson text sent per lesson by keeping its most central and on-topic
+    sentences; the tokens saved are in result["compression"].
+    previous_result (an earlier result, or just its "lesson_plans" and
+    "fingerprints") makes this a regeneration: lessons whose inputs are
+    unchanged are reused, changed section sets are patched with a
+    section-only request, and only lessons with new text or topic are
+    generated again (see incremental.py).
+    """
+    completed_lessons = completed_lessons or {}
+    if compress_tokens is None:
+        compress_tokens = LESSON_COMPRESSION_TARGET_TOKENS
+    started = time.perf_counter()
+    plan = plan_lesson_chunks(
+        file_bytes, page_no, override_num_lessons, chunking_mode, topic_names
+    )
+    num_lessons = plan["num_lessons"]
+    chunks = plan["chunks"]
+    # Fingerprints, compression and prompts all need one topic per lesson
+    if len(topic_names) < num_lessons:
+        raise ValueError(
+            f"The chapter was split into {num_lessons} lessons but {len(topic_names)} topic names "
+            "were given; enter a topic for every lesson or choose the number of lesson plans"
+        )
 
-    num_lessons = override_num_lessons or determine_lesson_count(wc)
-    chunks = split_into_lesson_chunks(text, num_lessons)
+    yield {
+        "type": "plan",
+        "num_lessons": num_lessons,
+        "topic_names": topic_names[:num_lessons],
+    }
 
     client = LessonPlanLLMClient()
-    lesson_plans = []
+    lesson_stats: List[Dict[str, Any]] = [{} for _ in chunks]
+    pending = [i for i in range(len(chunks)) if i + 1 not in completed_lessons]
+
+    # -------- INCREMENTAL REGENERATION --------
+    sections = build_sections(
+        domains,
+        curricular_goals,
+        competencies,
+        extra_sections,
+        include_learning_outcomes,
+        include_teaching_aids,
+        include_strategy,
+        include_interdisciplinary,
+        include_extended,
+    )
+    fingerprints = [
+        lesson_fingerprint(chunks[i], topic_names[i], sections, extra_sections, compress_tokens)
+        for i in range(len(chunks))
+    ]
+    previous_plans = (previous_result or {}).get("lesson_plans") or []
+    previous_fingerprints = (previous_result or {}).get("fingerprints") or []
+    updates: Dict[int, Dict[str, Any]] = {}
+    if previous_result:
+        for i in pending:
+            updates[i] = plan_lesson_update(
+                previous_plans[i] if i < len(previous_plans) else None,
+                previous_fingerprints[i] if i < len(previous_fingerprints) else None,
+                fingerprints[i],
+            )
+            lesson_stats[i]["regeneration"] = updates[i]["action"]
+        pending = [i for i in pending if updates[i]["action"] != "reuse"]
+
+    # What is actually sent per lesson: the chunk, or its extractive summary
+    lesson_texts = list(chunks)
+    compression = None
+    if compress_tokens > 0:
+        with span("compress", plan["timings"]):
+            for i in pending:
+                lesson_texts[i], lesson_stats[i]["compression"] = compress_text(
+                    chunks[i], topic_names[i], compress_tokens
+                )
+        compression = summarize_compression(lesson_stats, compress_tokens)
+        registry.inc("lessonplan_compression_tokens_saved_total", compression["tokens_saved"])
+
+    def _run_batch(indices: List[int]) -> Dict[int, Dict[str, Any]]:
+        batch_stats: Dict[str, Any] = {}
+        try:
+            return client.generate_lesson_plans_batch(
+                lessons=[
+                    {"lesson_text": lesson_texts[i], "topic_name": topic_names[i], "lesson_plan_no": i + 1}
+                    for i in indices
+                ],
+                grade=grade,
+                chapter_name=chapter_name,
+                page_no=page_no,
+                domains=domains,
+                curricular_goals=curricular_goals,
+                competencies=competencies,
+                extra_sections=extra_sections,
+                include_learning_outcomes=include_learning_outcomes,
+                include_teaching_aids=include_teaching_aids,
+                include_strategy=include_strategy,
+                include_interdisciplinary=include_interdisciplinary,
+                include_extended=include_extended,
+                use_cache=use_cache,
+                stats=batch_stats,
+                session_id=session_id,
+            )
+        finally:
+            for i in indices:
+                lesson_stats[i]["batch"] = batch_stats
+
+    batches = None
+    # Lessons that only need sections added are never batched
+    to_generate = [i for i in pending if updates.get(i, {"action": "generate"})["action"] == "generate"]
+    if (LLM_BATCH_MODE if batch_mode is None else batch_mode) and len(to_generate) > 1:
+        if compress_tokens > 0:
+            # Only pending lessons are batched, and each has its compressed size
+            chunk_tokens = [s.get("compression", {}).get("tokens_after", 0) for s in lesson_stats]
+        else:
+            chunk_tokens = plan.get("chunk_tokens") or [count_tokens(c) for c in chunks]
+        pending_batches = plan_lesson_batches([chunk_tokens[i] for i in to_generate])
+        batches = _LessonBatches(
+            [[to_generate[j] for j in batch] for batch in pending_batches],
+            _run_batch,
+        )
+
+    def _generate(i: int, emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        def emit_section(key: str, value: Any) -> None:
+            emit({
+                "type": "section",
+                "index": i,
+                "lesson_plan_no": i + 1,
+                "key": key,
+                "value": value,
+            })
 
-    for i, chunk in enumerate(chunks):
-        lp = client.generate_lesson_plan_fields(
-            lesson_text=chunk,
+        def reset_sections() -> None:
+            emit({"type": "sections_reset", "index": i, "lesson_plan_no": i + 1})
+
+        on_section = emit_section if stream_sections else None
+        on_reset = reset_sections if stream_sections else None
+
+        if i + 1 in completed_lessons:
+            lesson_stats[i]["resumed"] = True
+            return completed_lessons[i + 1]
+
+        update = updates.get(i, {"action": "generate"})
+        if update["action"] != "generate":
+            kept = merge_lesson(previous_plans[i], {}, update.get("drop", []), sections)
+            if on_section:
+                for key, value in kept.items():
+                    on_section(key, value)
+
+            def reset_added_sections() -> None:
+                # The reset withdraws the kept sections too; show them again
+                reset_sections()
+                for key, value in kept.items():
+                    on_section(key, value)
+
+            added: Dict[str, Any] = {}
+            if update.get("add"):
+                added = client.generate_lesson_sections(
+                    lesson_text=lesson_texts[i],
+                    topic_name=topic_names[i],
+                    existing=kept,
+                    new_sections=update["add"],
+                    use_cache=use_cache,
+                    stats=lesson_stats[i],
+                    session_id=session_id,
+                    on_section=on_section,
+                    on_reset=reset_added_sections if on_section else None,
+                )
+            if update.get("drop"):
+                lesson_stats[i]["sections_dropped"] = update["drop"]
+            return finalize_lesson(
+                merge_lesson(kept, added, [], sections),
+                sections, grade, chapter_name, topic_names[i], page_no, i + 1,
+            )
+
+        if batches is not None:
+            lesson = batches.get(i)
+            if lesson is not None:
+                if on_section:
+                    for key, value in lesson.items():
+                        if key not in SYSTEM_FIELDS:
+                            on_section(key, value)
+                return lesson
+            if "batch" in lesson_stats[i]:
+                lesson_stats[i]["batch_fallback"] = True
+
+        return client.generate_lesson_plan_fields(
+            lesson_text=lesson_texts[i],
             grade=grade,
             chapter_name=chapter_name,
             topic_name=topic_names[i],
@@ -49,10 +513,126 @@ def generate_lesson_plans_from_pdf(
             include_strategy=include_strategy,
             include_interdisciplinary=include_interdisciplinary,
             include_extended=include_extended,
+            use_cache=use_cache,
+            stats=lesson_stats[i],
+            session_id=session_id,
+            on_section=on_section,
+            on_reset=on_reset,
         )
-        lesson_plans.append(lp)
 
-    return {
-        "num_lessons": num_lessons,
-        "lesson_plans": lesson_plans,
+    outcomes: List[Dict[str, Any]] = [{} for _ in chunks]
+    for event in _iter_lesson_events(
+        _generate,
+        len(chunks),
+        max_concurrency or LLM_MAX_CONCURRENCY,
+        session_id,
+    ):
+        if event["type"] == "lesson":
+            outcomes[event["index"]] = event
+            stats = lesson_stats[event["index"]]
+            registry.inc("lessonplan_lessons_total", outcome=_lesson_outcome(event, stats))
+            event = dict(event, stats=stats)
+        yield event
+
+    lesson_plans = []
+    errors = []
+    for outcome in outcomes:
+        i = outcome["index"]
+        if "error" in outcome:
+            # Keep a placeholder so lesson numbering stays intact
+            lesson_plans.append({
+                "grade": grade,
+                "chapter_name": chapter_name,
+                "topic_name": topic_names[i],
+                "page_no": page_no,
+                "lesson_plan_no": i + 1,
+                "error": outcome["error"],
+            })
+            errors.append({"lesson_plan_no": i + 1, "error": outcome["error"]})
+        else:
+            lesson_plans.append(outcome["lesson"])
+
+    yield {
+        "type": "result",
+        "result": {
+            "document_digest": plan["document_digest"],
+            "num_lessons": num_lessons,
+            "lesson_plans": lesson_plans,
+            "errors": errors,
+            "chunk_tokens": plan.get("chunk_tokens"),
+            "lesson_stats": lesson_stats,
+            "cache_stats": client.cache.stats() if client.cache is not None else None,
+            "timings": dict(plan["timings"], total=time.perf_counter() - started),
+            "usage": summarize_usage(lesson_stats),
+            "cleanup": plan.get("cleanup"),
+            "page_warning": plan.get("page_warning"),
+            "compression": compression,
+            "fingerprints": fingerprints,
+            "regeneration": (
+                dict(Counter(s["regeneration"] for s in lesson_stats if "regeneration" in s))
+                if previous_result else None
+            ),
+        },
     }
+
+
+def generate_lesson_plans_from_pdf(
+    file_bytes: bytes,
+    grade: str,
+    chapter_name: str,
+    topic_names: List[str],
+    page_no: str,
+    override_num_lessons: Optional[int],
+    domains,
+    curricular_goals,
+    competencies,
+    extra_sections,
+    include_learning_outcomes: bool,
+    include_teaching_aids: bool,
+    include_strategy: bool,
+    include_interdisciplinary: bool,
+    include_extended: bool,
+    max_concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    chunking_mode: Optional[str] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    session_id: str = "default",
+    batch_mode: Optional[bool] = None,
+    completed_lessons: Optional[Dict[int, Dict[str, Any]]] = None,
+    compress_tokens: Optional[int] = None,
+    previous_result: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Non-streaming wrapper: runs the whole chapter and returns the result dict.
+    progress_callback receives "lesson" and "queue" events on this thread.
+    """
+    for event in stream_lesson_plans_from_pdf(
+        file_bytes=file_bytes,
+        grade=grade,
+        chapter_name=chapter_name,
+        topic_names=topic_names,
+        page_no=page_no,
+        override_num_lessons=override_num_lessons,
+        domains=domains,
+        curricular_goals=curricular_goals,
+        competencies=competencies,
+        extra_sections=extra_sections,
+        include_learning_outcomes=include_learning_outcomes,
+        include_teaching_aids=include_teaching_aids,
+        include_strategy=include_strategy,
+        include_interdisciplinary=include_interdisciplinary,
+        include_extended=include_extended,
+        max_concurrency=max_concurrency,
+        use_cache=use_cache,
+        chunking_mode=chunking_mode,
+        session_id=session_id,
+        stream_sections=False,
+        batch_mode=batch_mode,
+        completed_lessons=completed_lessons,
+        compress_tokens=compress_tokens,
+        previous_result=previous_result,
+    ):
+        if event["type"] == "result":
+            return event["result"]
+        if progress_callback and event["type"] in ("lesson", "queue"):
+            progress_callback(event)
@@ -0,0 +1,285 @@
+# hedging.py
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+import numpy as np
+
+from config import (
+    LLM_HEDGING_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_INITIAL_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MAX_RATE,
+)
+from metrics import registry
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    A lesson ran out of its latency budget.
+    """
+
+
+class RequestCancelled(Exception):
+    """
+    Raised inside a request whose twin already returned a reply.
+    """
+
+
+class Deadline:
+    """
+    A lesson's latency budget. The clock stops while every request of the
+    lesson that is in progress is still queued behind a rate limiter, so
+    waiting for quota never uses up the budget; sending, streaming and
+    retry back-off do. Safe to share between threads.
+    """
+
+    def __init__(self, seconds: float):
+        self._expires_at = time.monotonic() + seconds
+        self._active = 0
+        self._queued = 0
+        self._paused_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _update(self) -> None:
+        # Caller holds the lock
+        paused = self._active > 0 and self._queued == self._active
+        now = time.monotonic()
+        if paused and self._paused_at is None:
+            self._paused_at = now
+        elif not paused and self._paused_at is not None:
+            self._expires_at += now - self._paused_at
+            self._paused_at = None
+
+    def expires_at(self) -> float:
+        """
+        The time.monotonic() instant the budget runs out, if the clock keeps
+        running from now.
+        """
+        with self._lock:
+            if self._paused_at is not None:
+                return self._expires_at + time.monotonic() - self._paused_at
+            return self._expires_at
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at()
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        """
+        Wraps one request, from routing to the last byte of the reply.
+        """
+        with self._lock:
+            self._active += 1
+            self._update()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._update()
+
+    @contextmanager
+    def queued(self) -> Iterator[None]:
+        """
+        Wraps a request's rate-limiter wait (inside request()).
+        """
+        with self._lock:
+            self._queued += 1
+            self._update()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._queued -= 1
+                self._update()
+
+
+class HedgePolicy:
+    """
+    Decides when to send a duplicate (hedge) request: once the first one has
+    been running longer than the observed latency percentile (p90 by
+    default) of recent completions. Hedges are capped at max_rate of all
+    requests so a slow provider cannot double the bill. Safe to share
+    between threads.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_HEDGING_ENABLED,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+        initial_delay: float = LLM_HEDGE_INITIAL_DELAY_SECONDS,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        max_rate: float = LLM_HEDGE_MAX_RATE,
+        window: int = 200,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.requests = 0
+        self.hedges = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """
+        How long the first request may run before it is hedged.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return max(self.min_delay, self.initial_delay)
+            observed = float(np.percentile(list(self._latencies), self.percentile * 100))
+        return max(self.min_delay, observed)
+
+    def expected_remaining(self, elapsed: float) -> float:
+        """
+        Mean extra time a request still running after elapsed seconds used to
+        take (0 if none ran that long); the basis for "latency saved".
+        """
+        with self._lock:
+            slower = [s for s in self._latencies if s > elapsed]
+        return float(np.mean(slower)) - elapsed if slower else 0.0
+
+    def start_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def allow_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * max(1, self.requests):
+                return False
+            self.hedges += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+                "samples": len(self._latencies),
+            }
+
+
+def run_hedged(
+    attempt: Callable[[threading.Event], T],
+    policy: HedgePolicy,
+    deadline: Optional[Deadline] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> T:
+    """
+    Runs attempt(cancel) and, if it is still running after the policy's
+    hedge delay, a second copy; the first successful reply wins and the
+    other copy's cancel event is set. DeadlineExceeded is raised once
+    deadline runs out. If every copy fails,
+    the first copy's error is raised.
+    """
+    stats = stats if stats is not None else {}
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("The lesson's latency budget is used up")
+    policy.start_request()
+    if not policy.enabled and deadline is None:
+        started = time.monotonic()
+        result = attempt(threading.Event())
+        policy.record_latency(time.monotonic() - started)
+        return result
+
+    results: "queue.Queue[Any]" = queue.Queue()
+    cancels: List[threading.Event] = []
+    launched_at: Dict[str, float] = {}
+
+    def launch(tag: str) -> None:
+        cancel = threading.Event()
+        cancels.append(cancel)
+        launched_at[tag] = time.monotonic()
+
+        def run() -> None:
+            try:
+                results.put((tag, attempt(cancel), None))
+            except Exception as e:
+                results.put((tag, None, e))
+
+        threading.Thread(target=run, name=f"llm-{tag}", daemon=True).start()
+
+    def cancel_all() -> None:
+        for cancel in cancels:
+            cancel.set()
+
+    launch("primary")
+    started = launched_at["primary"]
+    hedge_at = started + policy.hedge_delay() if policy.enabled else None
+    running = 1
+    errors: List[Exception] = []
+
+    while running:
+        now = time.monotonic()
+        expires_at = deadline.expires_at() if deadline is not None else None
+        waits = [t - now for t in (expires_at, hedge_at) if t is not None]
+        try:
+            tag, value, error = results.get(timeout=max(0.0, min(waits)) if waits else None)
+        except queue.Empty:
+            now = time.monotonic()
+            if deadline is not None and deadline.expired():
+                cancel_all()
+                registry.inc("lessonplan_lesson_deadline_exceeded_total")
+                stats["deadline_exceeded"] = True
+                raise DeadlineExceeded(f"No reply within the lesson's latency budget ({now - started:.1f}s)")
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                if policy.allow_hedge():
+                    launch("hedge")
+                    running += 1
+                    stats["hedged"] = stats.get("hedged", 0) + 1
+                    stats["hedge_after_s"] = now - started
+            continue
+
+        running -= 1
+        if error is not None:
+            errors.append(error)
+            continue
+
+        cancel_all()
+        finished = time.monotonic()
+        policy.record_latency(finished - launched_at[tag])
+        if "hedge" in launched_at:
+            won = tag == "hedge"
+            registry.inc("lessonplan_llm_hedges_total", winner=tag)
+            stats["hedge_won"] = stats.get("hedge_won", 0) + (1 if won else 0)
+            if won:
+                saved = policy.expected_remaining(finished - started)
+                stats["hedge_saved_s"] = stats.get("hedge_saved_s", 0.0) + saved
+                registry.inc("lessonplan_llm_hedge_saved_seconds_total", saved)
+        return value
+
+    raise errors[0]
+
+
+# -------- PROCESS-WIDE INSTANCE --------
+_shared_policy: Optional[HedgePolicy] = None
+_shared_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """
+    Returns the hedge policy (and its latency history) shared by every session.
+    """
+    global _shared_policy
+    with _shared_policy_lock:
+        if _shared_policy is None:
+            _shared_policy = HedgePolicy()
+        return _shared_policy
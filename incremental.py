@@ -0,0 +1,80 @@
+# incremental.py
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from config import GROQ_MODEL
+from lesson_schema import SYSTEM_FIELDS, content_sections
+
+
+def _hash(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def lesson_fingerprint(
+    chunk: str,
+    topic_name: str,
+    sections: List[str],
+    extra_sections: List[Dict[str, str]],
+    compress_tokens: int = 0,
+) -> Dict[str, Any]:
+    """
+    What a generated lesson depends on: "content" covers the lesson text,
+    topic, model and compression target (a change means a full
+    regeneration); "sections" maps each content section to a hash of its
+    definition, so sections can be added or dropped one by one.
+    """
+    extras = {sec["title"].lower().replace(" ", "_"): sec for sec in extra_sections}
+    return {
+        "content": _hash([GROQ_MODEL, chunk, topic_name, compress_tokens]),
+        "sections": {
+            key: _hash([key, extras[key]["title"], extras[key].get("content", "")] if key in extras else key)
+            for key in content_sections(sections)
+        },
+    }
+
+
+def plan_lesson_update(
+    previous_lesson: Optional[Dict[str, Any]],
+    previous_fingerprint: Optional[Dict[str, Any]],
+    fingerprint: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    How to bring a previously generated lesson up to date:
+      {"action": "generate"} when there is no usable previous lesson or its
+        text/topic changed,
+      {"action": "reuse"} when nothing the LLM sees has changed,
+      {"action": "update", "drop": [...], "add": [...]} when only the
+        section set changed (drop locally, generate the added ones).
+    """
+    if (
+        not previous_lesson
+        or "error" in previous_lesson
+        or not previous_fingerprint
+        or previous_fingerprint.get("content") != fingerprint["content"]
+    ):
+        return {"action": "generate"}
+
+    old, new = previous_fingerprint.get("sections", {}), fingerprint["sections"]
+    drop = [key for key in old if old[key] != new.get(key)]
+    # A section missing from the old reply is generated now as well
+    add = [key for key in new if old.get(key) != new[key] or key not in previous_lesson]
+    if not drop and not add:
+        return {"action": "reuse"}
+    return {"action": "update", "drop": drop, "add": add}
+
+
+def merge_lesson(
+    previous_lesson: Dict[str, Any],
+    new_sections: Dict[str, Any],
+    drop: List[str],
+    sections: List[str],
+) -> Dict[str, Any]:
+    """
+    The previous lesson minus dropped sections plus newly generated ones,
+    in display order. System fields are left for finalize_lesson to set.
+    """
+    merged = {k: v for k, v in previous_lesson.items() if k not in drop and k not in SYSTEM_FIELDS}
+    merged.update(new_sections)
+    return {k: merged[k] for k in sections if k in merged}
@@ -0,0 +1,376 @@
+# job_queue.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from config import (
+    JOB_DB_PATH,
+    JOB_WORKERS,
+    JOB_RETENTION_SECONDS,
+)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class JobStore:
+    """
+    SQLite store for generation jobs: inputs (including the PDF), per-lesson
+    results, streamed sections and the final result. Everything a worker
+    produces is written here as it happens, so a job can be watched from any
+    Streamlit session and resumed after a restart. Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                pdf BLOB NOT NULL,
+                num_lessons INTEGER,
+                topic_names TEXT,
+                queue TEXT,
+                error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id, created_at);
+            CREATE TABLE IF NOT EXISTS job_lessons (
+                job_id TEXT NOT NULL,
+                lesson_plan_no INTEGER NOT NULL,
+                lesson TEXT,
+                error TEXT,
+                stats TEXT,
+                PRIMARY KEY (job_id, lesson_plan_no)
+            );
+            CREATE TABLE IF NOT EXISTS job_sections (
+                job_id TEXT NOT NULL,
+                lesson_plan_no INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_sections ON job_sections (job_id, lesson_plan_no);
+            """
+        )
+        self._conn.commit()
+
+    # -------- WRITES --------
+    def create(self, job_id: str, session_id: str, params: Dict[str, Any], file_bytes: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, session_id, status, params, pdf, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, session_id, _dumps(params), file_bytes, now, now),
+            )
+            self._conn.commit()
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id)
+            )
+            self._conn.commit()
+
+    def mark_running(self, job_id: str) -> None:
+        self._update(job_id, status="running", error=None)
+
+    def set_plan(self, job_id: str, num_lessons: int, topic_names: List[str]) -> None:
+        self._update(job_id, num_lessons=num_lessons, topic_names=_dumps(topic_names))
+
+    def set_queue(self, job_id: str, queue_info: Optional[Dict[str, Any]]) -> None:
+        self._update(job_id, queue=_dumps(queue_info) if queue_info else None)
+
+    def add_section(self, job_id: str, lesson_plan_no: int, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_sections (job_id, lesson_plan_no, key, value) VALUES (?, ?, ?, ?)",
+                (job_id, lesson_plan_no, key, _dumps(value)),
+            )
+            self._conn.commit()
+
+    def clear_sections(self, job_id: str, lesson_plan_no: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_sections WHERE job_id = ? AND lesson_plan_no = ?",
+                (job_id, lesson_plan_no),
+            )
+            self._conn.commit()
+
+    def save_lesson(
+        self,
+        job_id: str,
+        lesson_plan_no: int,
+        lesson: Optional[Dict[str, Any]],
+        error: Optional[str],
+        stats: Dict[str, Any],
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_lessons (job_id, lesson_plan_no, lesson, error, stats) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    lesson_plan_no,
+                    _dumps(lesson) if lesson is not None else None,
+                    error,
+                    _dumps(stats),
+                ),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._update(job_id, status="done", queue=None, result=_dumps(result))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._update(job_id, status="failed", queue=None, error=error)
+
+    def reset_for_resume(self, job_id: str) -> None:
+        """
+        Drops failed lessons and the partial sections of unfinished ones, so
+        a resumed job regenerates them from scratch.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_lessons WHERE job_id = ? AND lesson IS NULL", (job_id,)
+            )
+            self._conn.execute(
+                "DELETE FROM job_sections WHERE job_id = ? AND lesson_plan_no NOT IN "
+                "(SELECT lesson_plan_no FROM job_lessons WHERE job_id = ?)",
+                (job_id, job_id),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', queue = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def purge_older_than(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            ids = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?",
+                    (cutoff,),
+                )
+            ]
+            for table, column in (("job_sections", "job_id"), ("job_lessons", "job_id"), ("jobs", "id")):
+                self._conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(i,) for i in ids])
+            self._conn.commit()
+        return len(ids)
+
+    # -------- READS --------
+    def load_inputs(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, params, pdf FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"session_id": row[0], "params": json.loads(row[1]), "file_bytes": row[2]}
+
+    def completed_lessons(self, job_id: str) -> Dict[int, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lesson_plan_no, lesson FROM job_lessons WHERE job_id = ? AND lesson IS NOT NULL",
+                (job_id,),
+            ).fetchall()
+        return {no: json.loads(lesson) for no, lesson in rows}
+
+    def active_job_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Progress snapshot of one job: status, per-lesson results and the
+        sections streamed so far for lessons that are still being written.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, num_lessons, topic_names, queue, error, result, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            status, num_lessons, topic_names, queue_info, error, result, created_at, updated_at = row
+
+            jobs_ahead = 0
+            if status == "queued":
+                jobs_ahead = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?",
+                    (created_at,),
+                ).fetchone()[0]
+
+            lesson_rows = self._conn.execute(
+                "SELECT lesson_plan_no, lesson, error, stats FROM job_lessons WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+            section_rows = self._conn.execute(
+                "SELECT lesson_plan_no, key, value FROM job_sections WHERE job_id = ? ORDER BY rowid",
+                (job_id,),
+            ).fetchall()
+
+        lessons = {
+            no: {
+                "lesson": json.loads(lesson) if lesson is not None else None,
+                "error": err,
+                "stats": json.loads(stats) if stats else {},
+            }
+            for no, lesson, err, stats in lesson_rows
+        }
+        sections: Dict[int, List[Any]] = {}
+        for no, key, value in section_rows:
+            if no not in lessons:
+                sections.setdefault(no, []).append((key, json.loads(value)))
+
+        return {
+            "id": job_id,
+            "status": status,
+            "num_lessons": num_lessons,
+            "topic_names": json.loads(topic_names) if topic_names else [],
+            "completed": len(lessons),
+            "lessons": lessons,
+            "sections": sections,
+            "queue": json.loads(queue_info) if queue_info else None,
+            "jobs_ahead": jobs_ahead,
+            "error": error,
+            "result": json.loads(result) if result else None,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def list_jobs(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, params, created_at FROM jobs WHERE session_id = ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (session_id, limit),
+            ).fetchall()
+        return [
+            {
+                "id": job_id,
+                "status": status,
+                "chapter_name": json.loads(params).get("chapter_name", ""),
+                "created_at": created_at,
+            }
+            for job_id, status, params, created_at in rows
+        ]
+
+
+class JobManager:
+    """
+    Runs queued jobs on a fixed pool of worker threads, independent of any
+    Streamlit script run. Jobs left queued or running by a previous process
+    are picked up again on start, keeping the lessons they had finished.
+    """
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="lesson-job"
+        )
+        self.store.purge_older_than(JOB_RETENTION_SECONDS)
+        for job_id in self.store.active_job_ids():
+            self.store.reset_for_resume(job_id)
+            self._executor.submit(self._run, job_id)
+
+    def submit(self, file_bytes: bytes, params: Dict[str, Any], session_id: str) -> str:
+        """
+        Queues one chapter; params are the keyword arguments of
+        stream_lesson_plans_from_pdf other than file_bytes and session_id.
+        """
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, session_id, params, file_bytes)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get_job(job_id)
+
+    def _run(self, job_id: str) -> None:
+        inputs = self.store.load_inputs(job_id)
+        if inputs is None:
+            return
+        self.store.mark_running(job_id)
+        # Imported here so the UI can list and poll jobs without loading the
+        # PDF/LLM stack until a job actually runs
+        from generator import stream_lesson_plans_from_pdf
+
+        try:
+            for event in stream_lesson_plans_from_pdf(
+                file_bytes=inputs["file_bytes"],
+                session_id=inputs["session_id"],
+                completed_lessons=self.store.completed_lessons(job_id),
+                **inputs["params"],
+            ):
+                if event["type"] == "plan":
+                    self.store.set_plan(job_id, event["num_lessons"], event["topic_names"])
+                elif event["type"] == "section":
+                    self.store.add_section(
+                        job_id, event["lesson_plan_no"], event["key"], event["value"]
+                    )
+                elif event["type"] == "sections_reset":
+                    self.store.clear_sections(job_id, event["lesson_plan_no"])
+                elif event["type"] == "lesson":
+                    if event["stats"].get("resumed"):
+                        continue
+                    self.store.save_lesson(
+                        job_id,
+                        event["index"] + 1,
+                        event.get("lesson"),
+                        event.get("error"),
+                        event["stats"],
+                    )
+                    self.store.set_queue(job_id, None)
+                elif event["type"] == "queue":
+                    self.store.set_queue(job_id, event)
+                elif event["type"] == "result":
+                    self.store.finish(job_id, event["result"])
+        except Exception as e:
+            self.store.fail(job_id, f"{type(e).__name__}: {e}")
+
+
+# -------- PROCESS-WIDE INSTANCE --------
+_shared_manager: Optional[JobManager] = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the process-wide job manager, starting its workers on first use.
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = JobManager(JobStore(JOB_DB_PATH), JOB_WORKERS)
+        return _shared_manager
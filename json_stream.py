@@ -0,0 +1,73 @@
+# json_stream.py
+import json
+from typing import Any, List, Tuple
+
+
+class IncrementalJSONObjectParser:
+    """
+    Incremental parser for a single JSON object arriving in fragments
+    (e.g. streamed LLM tokens). feed() returns the top-level (key, value)
+    members completed by that fragment, so each section can be used as
+    soon as its value is closed. Text before the opening "{" is ignored.
+    Each character is scanned once; only completed members are json-decoded.
+    """
+
+    def __init__(self):
+        self._member: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.started = False
+        self.finished = False
+
+    def feed(self, fragment: str) -> List[Tuple[str, Any]]:
+        completed = []
+        for ch in fragment:
+            if self.finished:
+                break
+
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.finished = True
+                    self._complete_member(completed)
+                    continue
+            elif ch == "," and self._depth == 1:
+                self._complete_member(completed)
+                continue
+
+            self._member.append(ch)
+
+        return completed
+
+    def _complete_member(self, completed: List[Tuple[str, Any]]) -> None:
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return
+        try:
+            member = json.loads("{" + text + "}")
+        except json.JSONDecodeError:
+            # Left for the full-reply parser to recover or reject
+            return
+        completed.extend(member.items())
@@ -0,0 +1,82 @@
+# lesson_schema.py
+from typing import Any, Dict, List, Optional
+
+from config import LLM_RESPONSE_FORMAT
+
+# Always overwritten from the request, never taken from the model
+SYSTEM_FIELDS = ("grade", "chapter_name", "topic_name", "page_no", "lesson_plan_no")
+
+_SECTION_VALUE_SCHEMA = {
+    "anyOf": [
+        {"type": "string"},
+        {"type": "array", "items": {"type": "string"}},
+        {"type": "object"},
+    ]
+}
+
+
+class OffSchemaError(ValueError):
+    """
+    The model's output left the expected lesson-plan shape.
+    """
+
+
+def content_sections(sections: List[str]) -> List[str]:
+    return [s for s in sections if s not in SYSTEM_FIELDS]
+
+
+def build_lesson_schema(sections: List[str]) -> Dict[str, Any]:
+    """
+    JSON schema for one lesson plan: exactly the enabled content sections.
+    """
+    fields = content_sections(sections)
+    return {
+        "type": "object",
+        "properties": {s: _SECTION_VALUE_SCHEMA for s in fields},
+        "required": fields,
+        "additionalProperties": False,
+    }
+
+
+def build_response_format(sections: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Provider response_format for LLM_RESPONSE_FORMAT ("json_schema",
+    "json_object" or "off").
+    """
+    if LLM_RESPONSE_FORMAT == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "lesson_plan", "schema": build_lesson_schema(sections)},
+        }
+    if LLM_RESPONSE_FORMAT == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
+class LessonSchemaGuard:
+    """
+    Checks a structured reply against the enabled sections, so an off-schema
+    lesson plan is retried instead of being silently trimmed.
+    """
+
+    def __init__(self, sections: List[str]):
+        self.allowed = set(sections)
+        self.required = content_sections(sections)
+
+    def check_member(self, key: str, value: Any) -> None:
+        if key not in self.allowed:
+            raise OffSchemaError(f"Unexpected section '{key}'")
+        if key not in SYSTEM_FIELDS and not isinstance(value, (str, list, dict)):
+            raise OffSchemaError(
+                f"Section '{key}' has invalid type {type(value).__name__}"
+            )
+
+    def check_object(self, data: Any) -> List[str]:
+        """
+        Validates a complete reply; returns the required sections it is missing.
+        """
+        if not isinstance(data, dict):
+            raise OffSchemaError("Reply is not a JSON object")
+        for key, value in data.items():
+            self.check_member(key, value)
+        return [s for s in self.required if s not in data]
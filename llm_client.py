@@ -1,20 +1,170 @@
 # llm_client.py
-from typing import Dict, Any, List, Optional
+from contextlib import nullcontext
+from typing import Dict, Any, List, Optional, Callable, Tuple
 import json
 import os
-from groq import Groq
+import threading
+import time
 
-from config import TARGET_LESSON_DURATION_MIN, MAX_LESSON_DURATION_MIN
+from config import (
+    TARGET_LESSON_DURATION_MIN,
+    MAX_LESSON_DURATION_MIN,
+    EXPECTED_COMPLETION_TOKENS,
+    LLM_SCHEMA_RETRIES,
+    LLM_LESSON_DEADLINE_SECONDS,
+)
+from llm_cache import get_response_cache, make_cache_key
+from llm_providers import Provider, get_provider_pool
+from llm_resilience import CircuitOpenError, call_with_retries, is_retryable_error
+from hedging import Deadline, RequestCancelled, get_hedge_policy, run_hedged
+from json_stream import IncrementalJSONObjectParser
+from lesson_schema import (
+    SYSTEM_FIELDS,
+    LessonSchemaGuard,
+    OffSchemaError,
+    build_response_format,
+    content_sections,
+)
+from tokens import count_tokens
+from metrics import registry, span
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-safeguard-20b")
 
 
+def _parse_json_object(raw_content: Optional[str]) -> Dict[str, Any]:
+    """
+    Parses the LLM reply as JSON, recovering the outermost {...} if needed.
+    """
+    if not raw_content or not raw_content.strip():
+        raise ValueError("LLM returned empty response")
+
+    try:
+        return json.loads(raw_content)
+    except json.JSONDecodeError:
+        start = raw_content.find("{")
+        end = raw_content.rfind("}")
+        if start == -1 or end == -1:
+            raise ValueError(f"Invalid LLM output:\n{raw_content}")
+        return json.loads(raw_content[start:end + 1])
+
+
+def build_sections(
+    domains,
+    curricular_goals,
+    competencies,
+    extra_sections,
+    include_learning_outcomes: bool,
+    include_teaching_aids: bool,
+    include_strategy: bool,
+    include_interdisciplinary: bool,
+    include_extended: bool,
+) -> List[str]:
+    """
+    Section keys a lesson plan may contain, in display order.
+    """
+    sections = [
+        "grade", "chapter_name", "page_no",
+        "topic_name", "lesson_plan_no"
+    ]
+
+    if domains: sections.append("domains")
+    if curricular_goals: sections.append("curricular_goals")
+    if competencies: sections.append("competencies")
+    if include_learning_outcomes: sections.append("learning_outcomes")
+    if include_teaching_aids: sections.append("teaching_aids")
+    if include_strategy: sections.append("strategy_pedagogy")
+    if include_interdisciplinary: sections.append("interdisciplinary_approach")
+    if include_extended: sections.append("extended_learning_assignment")
+
+    for sec in extra_sections:
+        sections.append(sec["title"].lower().replace(" ", "_"))
+
+    return sections
+
+
+def finalize_lesson(
+    data: Dict[str, Any],
+    sections: List[str],
+    grade: str,
+    chapter_name: str,
+    topic_name: str,
+    page_no: str,
+    lesson_plan_no: int,
+) -> Dict[str, Any]:
+    # -------- FILTER ALLOWED SECTIONS (EXISTING LOGIC) --------
+    cleaned = {k: v for k, v in data.items() if k in sections}
+
+    # -------- FORCE SYSTEM-CONTROLLED FIELDS (ADDED) --------
+    cleaned["grade"] = grade
+    cleaned["chapter_name"] = chapter_name
+    cleaned["topic_name"] = topic_name
+    cleaned["page_no"] = page_no
+    cleaned["lesson_plan_no"] = lesson_plan_no
+
+    return cleaned
+
+
+def _split_batch_reply(data: Any) -> Dict[int, Dict[str, Any]]:
+    """
+    Accepts {"lessons": [...]}, a bare [...] or {"<n>": {...}} and returns
+    lesson objects keyed by lesson_plan_no.
+    """
+    if isinstance(data, dict) and isinstance(data.get("lessons"), list):
+        data = data["lessons"]
+
+    lessons: Dict[int, Dict[str, Any]] = {}
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                try:
+                    lessons[int(item.get("lesson_plan_no"))] = item
+                except (TypeError, ValueError):
+                    continue
+    elif isinstance(data, dict):
+        for key, item in data.items():
+            if isinstance(item, dict):
+                try:
+                    lessons[int(key)] = item
+                except ValueError:
+                    continue
+    return lessons
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """
+    True for a 400 complaining about response_format (unsupported by the
+    model or endpoint).
+    """
+    return getattr(error, "status_code", None) == 400 and "response_format" in str(error)
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    """
+    Token usage as a plain dict, whether the SDK gave an object or a dict
+    (e.g. Groq's x_groq extension on a streamed chunk).
+    """
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = {k: getattr(usage, k, None) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    return {k: usage.get(k) or 0 for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+def _chunk_usage(chunk: Any) -> Optional[Dict[str, int]]:
+    # Groq reports usage on the final chunk under x_groq; OpenAI under usage
+    x_groq = getattr(chunk, "x_groq", None)
+    if isinstance(x_groq, dict):
+        usage = x_groq.get("usage")
+    else:
+        usage = getattr(x_groq, "usage", None)
+    return _usage_dict(usage or getattr(chunk, "usage", None))
+
+
 class LessonPlanLLMClient:
     def __init__(self):
-        if not GROQ_API_KEY:
-            raise ValueError("GROQ_API_KEY not set")
-        self.client = Groq(api_key=GROQ_API_KEY)
+        self.pool = get_provider_pool()
+        self.cache = get_response_cache()
+        self.hedge_policy = get_hedge_policy()
 
     def generate_lesson_plan_fields(
         self,
@@ -33,24 +183,39 @@ class LessonPlanLLMClient:
         include_strategy: bool,
         include_interdisciplinary: bool,
         include_extended: bool,
+        use_cache: bool = True,
+        stats: Optional[Dict[str, Any]] = None,
+        session_id: str = "default",
+        on_section: Optional[Callable[[str, Any], None]] = None,
+        on_reset: Optional[Callable[[], None]] = None,
     ) -> Dict[str, Any]:
+        """
+        Generates one lesson plan. If a stats dict is passed it is filled with
+        per-request cache, queue, retry and latency figures. session_id is the
+        fair-share key for the shared rate limiter.
+        With on_section, on_section(key, value) is called for each allowed
+        section as soon as its value is complete (streamed unless
+        LLM_RESPONSE_FORMAT is set); on_reset() is called when sections
+        already shown are withdrawn because the attempt that wrote them was
+        retried.
+        The lesson gets LLM_LESSON_DEADLINE_SECONDS in total across retries
+        (rate-limit queueing not counted);
+        slow requests may be hedged (see hedging.HedgePolicy).
+        """
+        stats = stats if stats is not None else {}
+        started = time.perf_counter()
 
-        sections = [
-            "grade", "chapter_name", "page_no",
-            "topic_name", "lesson_plan_no"
-        ]
-
-        if domains: sections.append("domains")
-        if curricular_goals: sections.append("curricular_goals")
-        if competencies: sections.append("competencies")
-        if include_learning_outcomes: sections.append("learning_outcomes")
-        if include_teaching_aids: sections.append("teaching_aids")
-        if include_strategy: sections.append("strategy_pedagogy")
-        if include_interdisciplinary: sections.append("interdisciplinary_approach")
-        if include_extended: sections.append("extended_learning_assignment")
-
-        for sec in extra_sections:
-            sections.append(sec["title"].lower().replace(" ", "_"))
+        sections = build_sections(
+            domains,
+            curricular_goals,
+            competencies,
+            extra_sections,
+            include_learning_outcomes,
+            include_teaching_aids,
+            include_strategy,
+            include_interdisciplinary,
+            include_extended,
+        )
 
         prompt = f"""
 Generate a lesson plan ({TARGET_LESSON_DURATION_MIN}-{MAX_LESSON_DURATION_MIN} minutes).
@@ -71,35 +236,517 @@ Rules:
 - Output valid JSON only
 """
 
-        response = self.client.chat.completions.create(
-            model=GROQ_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
+        data = self._generate_object(
+            prompt, sections, stats, use_cache, session_id, on_section, on_reset, started
         )
 
-        raw_content = response.choices[0].message.content
+        cleaned = finalize_lesson(
+            data, sections, grade, chapter_name, topic_name, page_no, lesson_plan_no
+        )
 
-        # -------- SAFE JSON PARSING (ADDED) --------
-        if not raw_content or not raw_content.strip():
-            raise ValueError("LLM returned empty response")
+        stats["latency_s"] = time.perf_counter() - started
+        return cleaned
 
-        try:
-            data = json.loads(raw_content)
-        except json.JSONDecodeError:
-            start = raw_content.find("{")
-            end = raw_content.rfind("}")
-            if start == -1 or end == -1:
-                raise ValueError(f"Invalid LLM output:\n{raw_content}")
-            data = json.loads(raw_content[start:end + 1])
+    def generate_lesson_sections(
+        self,
+        lesson_text: str,
+        topic_name: str,
+        existing: Dict[str, Any],
+        new_sections: List[str],
+        use_cache: bool = True,
+        stats: Optional[Dict[str, Any]] = None,
+        session_id: str = "default",
+        on_section: Optional[Callable[[str, Any], None]] = None,
+        on_reset: Optional[Callable[[], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Generates only new_sections for an already generated lesson plan
+        (existing, sent as context so the new sections fit it). Returns
+        {section: value} for the new sections present in the reply; merging
+        is left to the caller (see incremental.merge_lesson).
+        """
+        stats = stats if stats is not None else {}
+        started = time.perf_counter()
+        sections = list(SYSTEM_FIELDS) + list(new_sections)
+        context = {k: v for k, v in existing.items() if k not in SYSTEM_FIELDS}
 
-        # -------- FILTER ALLOWED SECTIONS (EXISTING LOGIC) --------
-        cleaned = {k: v for k, v in data.items() if k in sections}
+        prompt = f"""
+Add sections to an existing lesson plan ({TARGET_LESSON_DURATION_MIN}-{MAX_LESSON_DURATION_MIN} minutes).
 
-        # -------- FORCE SYSTEM-CONTROLLED FIELDS (ADDED) --------
-        cleaned["grade"] = grade
-        cleaned["chapter_name"] = chapter_name
-        cleaned["topic_name"] = topic_name
-        cleaned["page_no"] = page_no
-        cleaned["lesson_plan_no"] = lesson_plan_no
+STRICT TOPIC: {topic_name}
 
-        return cleaned
+Existing lesson plan (stay consistent with it, do not repeat it):
+{json.dumps(context, ensure_ascii=False)}
+
+Include ONLY these new sections:
+{list(new_sections)}
+
+Lesson Text:
+\"\"\"
+{lesson_text}
+\"\"\"
+
+Rules:
+- Use topic exactly
+- Do not invent sections
+- Output valid JSON only
+"""
+
+        data = self._generate_object(
+            prompt, sections, stats, use_cache, session_id, on_section, on_reset, started
+        )
+        stats["latency_s"] = time.perf_counter() - started
+        stats["sections_generated"] = list(new_sections)
+        return {k: data[k] for k in new_sections if k in data}
+
+    def _generate_object(
+        self,
+        prompt: str,
+        sections: List[str],
+        stats: Dict[str, Any],
+        use_cache: bool,
+        session_id: str,
+        on_section: Optional[Callable[[str, Any], None]],
+        on_reset: Optional[Callable[[], None]],
+        started: float,
+    ) -> Dict[str, Any]:
+        """
+        Runs one lesson-shaped request: response cache, structured-output
+        guard, hedged and retried (streaming) call, and schema retries.
+        Returns the parsed reply.
+        """
+        deadline = Deadline(LLM_LESSON_DEADLINE_SECONDS) if LLM_LESSON_DEADLINE_SECONDS > 0 else None
+
+        messages = [{"role": "user", "content": prompt}]
+        temperature = 0.4
+        response_format = build_response_format(sections)
+
+        # -------- RESPONSE CACHE --------
+        # use_cache=False skips the lookup but still stores the fresh reply
+        timings = stats.setdefault("timings", {})
+        raw_content = self._cache_get(messages, temperature, response_format, use_cache, timings)
+        from_cache = raw_content is not None
+
+        stats["cache_hit"] = from_cache
+
+        # Each section is shown once, even if a retry or hedge streams it again
+        emitted: Dict[str, Any] = {}
+        emit_lock = threading.Lock()
+
+        def _emit(key: str, value: Any) -> None:
+            if key not in sections or key in SYSTEM_FIELDS:
+                return
+            with emit_lock:
+                if key in emitted:
+                    return
+                emitted[key] = value
+                stats.setdefault("time_to_first_section_s", time.perf_counter() - started)
+                on_section(key, value)
+
+        def _reset_sections() -> None:
+            # Sections shown from an abandoned attempt are withdrawn
+            with emit_lock:
+                if not emitted:
+                    return
+                emitted.clear()
+            if on_reset:
+                on_reset()
+
+        # -------- STRUCTURED OUTPUT GUARD --------
+        # Providers reject response_format on streamed requests, so in
+        # structured mode the reply is fetched whole and checked as one object;
+        # only plain replies are streamed section by section.
+        guard = LessonSchemaGuard(sections) if response_format else None
+        on_member = _emit if on_section and response_format is None else None
+
+        if from_cache:
+            with span("parse", timings):
+                data = _parse_json_object(raw_content)
+        else:
+            stats.setdefault("schema_retries", 0)
+            for schema_attempt in range(LLM_SCHEMA_RETRIES + 1):
+                last_attempt = schema_attempt == LLM_SCHEMA_RETRIES
+                try:
+                    raw_content, model = call_with_retries(
+                        lambda: run_hedged(
+                            lambda cancel: self._create_completion(
+                                messages, temperature, session_id, stats,
+                                on_member=on_member,
+                                response_format=response_format,
+                                cancel=cancel,
+                                deadline=deadline,
+                            ),
+                            self.hedge_policy,
+                            deadline,
+                            stats,
+                        ),
+                        stats=stats,
+                        deadline=deadline,
+                    )
+                    with span("parse", timings):
+                        data = _parse_json_object(raw_content)
+                    if guard is not None:
+                        try:
+                            stats["missing_sections"] = guard.check_object(data)
+                        except OffSchemaError:
+                            if not last_attempt or not isinstance(data, dict):
+                                raise
+                            # Out of retries: keep the allowed sections, as without a
+                            # schema (finalize_lesson drops the rest, forces SYSTEM_FIELDS)
+                            stats["schema_filtered"] = True
+                            stats["missing_sections"] = [s for s in guard.required if s not in data]
+                    break
+                except ValueError as e:
+                    # Off-schema or unparseable output (OffSchemaError is a ValueError)
+                    stats["last_schema_error"] = str(e)[:200]
+                    if last_attempt:
+                        raise
+                    stats["schema_retries"] += 1
+                    registry.inc("lessonplan_llm_schema_retries_total")
+                    _reset_sections()
+
+        if on_section:
+            # A retried stream or a hedge may have shown sections the final
+            # reply does not have (or has differently): start over from it
+            if any(key not in data or data[key] != value for key, value in emitted.items()):
+                _reset_sections()
+            for key, value in data.items():
+                _emit(key, value)
+
+        # Only cache replies that parsed (and met the schema), so a bad
+        # generation is never replayed
+        if not from_cache and not stats.get("schema_filtered"):
+            self._cache_put(model, messages, temperature, response_format, raw_content)
+
+        return data
+
+    def generate_lesson_plans_batch(
+        self,
+        lessons: List[Dict[str, Any]],
+        grade: str,
+        chapter_name: str,
+        page_no: str,
+        domains,
+        curricular_goals,
+        competencies,
+        extra_sections,
+        include_learning_outcomes: bool,
+        include_teaching_aids: bool,
+        include_strategy: bool,
+        include_interdisciplinary: bool,
+        include_extended: bool,
+        use_cache: bool = True,
+        stats: Optional[Dict[str, Any]] = None,
+        session_id: str = "default",
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Generates several lesson plans in one request. lessons is a list of
+        {"lesson_text", "topic_name", "lesson_plan_no"}; the shared
+        instructions and section list are sent once. Returns cleaned plans
+        keyed by lesson_plan_no for every lesson present and on-schema in the
+        reply; callers fall back to generate_lesson_plan_fields for the rest.
+        """
+        stats = stats if stats is not None else {}
+        started = time.perf_counter()
+
+        sections = build_sections(
+            domains,
+            curricular_goals,
+            competencies,
+            extra_sections,
+            include_learning_outcomes,
+            include_teaching_aids,
+            include_strategy,
+            include_interdisciplinary,
+            include_extended,
+        )
+
+        lesson_blocks = "\n".join(
+            f"""
+--- LESSON {lesson["lesson_plan_no"]} ---
+STRICT TOPIC: {lesson["topic_name"]}
+
+Lesson Text:
+\"\"\"
+{lesson["lesson_text"]}
+\"\"\"
+"""
+            for lesson in lessons
+        )
+
+        prompt = f"""
+Generate {len(lessons)} lesson plans ({TARGET_LESSON_DURATION_MIN}-{MAX_LESSON_DURATION_MIN} minutes each), one per lesson below.
+
+Include ONLY these sections in every lesson plan:
+{sections}
+{lesson_blocks}
+Rules:
+- Use each lesson's topic exactly
+- Do not invent sections
+- Output valid JSON only, in the form {{"lessons": [{{"lesson_plan_no": <number>, ...sections}}]}}
+"""
+
+        messages = [{"role": "user", "content": prompt}]
+        temperature = 0.4
+        response_format = {"type": "json_object"} if build_response_format(sections) else None
+
+        timings = stats.setdefault("timings", {})
+        raw_content = self._cache_get(messages, temperature, response_format, use_cache, timings)
+        from_cache = raw_content is not None
+        stats["cache_hit"] = from_cache
+
+        if not from_cache:
+            raw_content, model = call_with_retries(
+                lambda: self._create_completion(
+                    messages, temperature, session_id, stats,
+                    response_format=response_format,
+                ),
+                stats=stats,
+            )
+
+        with span("parse", timings):
+            replies = _split_batch_reply(_parse_json_object(raw_content))
+
+        if not from_cache and replies:
+            self._cache_put(model, messages, temperature, response_format, raw_content)
+
+        # -------- SPLIT INTO PER-LESSON PLANS --------
+        # Same section filtering + forced fields as a single-lesson reply;
+        # a lesson with no usable section counts as missing
+        content = set(content_sections(sections))
+        results: Dict[int, Dict[str, Any]] = {}
+        for lesson in lessons:
+            n = lesson["lesson_plan_no"]
+            data = replies.get(n)
+            if data is None or not content.intersection(data):
+                continue
+            results[n] = finalize_lesson(
+                data, sections, grade, chapter_name, lesson["topic_name"], page_no, n
+            )
+
+        stats["latency_s"] = time.perf_counter() - started
+        stats["batch_size"] = len(lessons)
+        stats["batch_missing"] = [l["lesson_plan_no"] for l in lessons if l["lesson_plan_no"] not in results]
+        return results
+
+    # -------- RESPONSE CACHE --------
+    # Replies are stored under the model that wrote them; a lookup accepts a
+    # reply from any model the pool currently serves.
+    def _cache_get(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        response_format: Optional[Dict[str, Any]],
+        use_cache: bool,
+        timings: Dict[str, float],
+    ) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        raw_content = None
+        with span("cache_lookup", timings):
+            for model in self.pool.models():
+                raw_content = self.cache.get(make_cache_key(
+                    model, messages, temperature=temperature, response_format=response_format
+                ))
+                if raw_content is not None:
+                    break
+        registry.inc(
+            "lessonplan_llm_cache_lookups_total",
+            result="hit" if raw_content is not None else "miss",
+        )
+        return raw_content
+
+    def _cache_put(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        response_format: Optional[Dict[str, Any]],
+        raw_content: str,
+    ) -> None:
+        if self.cache is not None:
+            self.cache.put(
+                make_cache_key(model, messages, temperature=temperature, response_format=response_format),
+                raw_content,
+            )
+
+    def _create_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        session_id: str,
+        stats: Dict[str, Any],
+        on_member: Optional[Callable[[str, Any], None]] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+        cancel: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[str, str]:
+        """
+        One completion from the provider pool. Each provider is tried at most
+        once, least-loaded first; a retryable failure moves straight on to the
+        next healthy provider, and only when all of them failed is the error
+        raised (for call_with_retries to back off). Returns the reply text
+        and the model that wrote it.
+        With on_member the reply is streamed and each top-level JSON member is
+        passed to on_member as soon as it is complete; on_member raising
+        aborts the stream, as does cancel being set (the other copy of a
+        hedged request won). response_format is only sent without on_member.
+        Time spent queued behind a rate limiter is kept off deadline.
+        """
+        tried: List[Provider] = []
+        last_error: Optional[Exception] = None
+        while True:
+            try:
+                provider = self.pool.acquire(exclude=tried)
+            except CircuitOpenError:
+                if not tried:
+                    raise
+                raise last_error
+            tried.append(provider)
+            failed = False
+            trial = False
+            try:
+                trial = provider.breaker.before_call()
+                with deadline.request() if deadline is not None else nullcontext():
+                    content = self._call_provider(
+                        provider, messages, temperature, session_id, stats,
+                        on_member, response_format, cancel, deadline,
+                    )
+                provider.breaker.record_success()
+                return content, provider.model
+            except CircuitOpenError as e:
+                # Half-open provider already has its trial call in flight
+                last_error = e
+            except RequestCancelled:
+                # Says nothing about the provider's health
+                raise
+            except Exception as e:
+                if not is_retryable_error(e):
+                    # The provider answered (bad request, off-schema output, ...)
+                    provider.breaker.record_success()
+                    raise
+                failed = True
+                if getattr(e, "status_code", None) != 429:
+                    # 429 means "this key is busy", not "provider broken"
+                    provider.breaker.record_failure()
+                last_error = e
+                stats["failovers"] = stats.get("failovers", 0) + 1
+                registry.inc("lessonplan_llm_failovers_total", provider=provider.name)
+            finally:
+                if trial:
+                    # A 429 or cancelled call must not leave the trial taken for good
+                    provider.breaker.release_trial()
+                self.pool.release(provider, failed=failed)
+
+    def _call_provider(
+        self,
+        provider: Provider,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        session_id: str,
+        stats: Dict[str, Any],
+        on_member: Optional[Callable[[str, Any], None]],
+        response_format: Optional[Dict[str, Any]],
+        cancel: Optional[threading.Event] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        """
+        One chat.completions.create call on provider, queued behind that
+        provider's rate limiter. If the provider rejects response_format
+        (400), the call is repeated without it and the provider is not sent
+        one again.
+        """
+        use_format = response_format is not None and provider.structured_output
+        timings = stats.setdefault("timings", {})
+        stats["provider"] = provider.name
+        estimated_tokens = 0
+        if provider.limiter is not None:
+            estimated_tokens = (
+                sum(count_tokens(m["content"]) for m in messages) + EXPECTED_COMPLETION_TOKENS
+            )
+            with span("queue_wait", timings), deadline.queued() if deadline is not None else nullcontext():
+                waited = provider.limiter.acquire(session_id, estimated_tokens, cancel)
+            stats["queue_wait_s"] = stats.get("queue_wait_s", 0.0) + waited
+
+        if cancel is not None and cancel.is_set():
+            # Timed out or beaten by the hedge while queued: hand the quota back unused
+            if provider.limiter is not None:
+                provider.limiter.reconcile(estimated_tokens, 0)
+            raise RequestCancelled("Request cancelled before it was sent")
+
+        if on_member is None:
+            with span("llm_call", timings):
+                try:
+                    response = provider.client.chat.completions.create(
+                        model=provider.model,
+                        messages=messages,
+                        temperature=temperature,
+                        **({"response_format": response_format} if use_format else {}),
+                    )
+                except Exception as e:
+                    if not use_format or not _rejects_response_format(e):
+                        raise
+                    provider.structured_output = False
+                    registry.inc("lessonplan_llm_response_format_rejected_total", provider=provider.name)
+                    response = provider.client.chat.completions.create(
+                        model=provider.model,
+                        messages=messages,
+                        temperature=temperature,
+                    )
+            self._record_usage(provider, estimated_tokens, _usage_dict(getattr(response, "usage", None)), stats)
+            return response.choices[0].message.content
+
+        # -------- STREAMING --------
+        with span("llm_call", timings):
+            stream = provider.client.chat.completions.create(
+                model=provider.model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            )
+            parser = IncrementalJSONObjectParser()
+            parts = []
+            usage = None
+            try:
+                for chunk in stream:
+                    if cancel is not None and cancel.is_set():
+                        if provider.limiter is not None:
+                            # Only the prompt was used; the completion estimate goes back
+                            provider.limiter.reconcile(
+                                estimated_tokens, estimated_tokens - EXPECTED_COMPLETION_TOKENS
+                            )
+                        raise RequestCancelled("Another copy of this request finished first")
+                    usage = _chunk_usage(chunk) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    for key, value in parser.feed(delta):
+                        on_member(key, value)
+            finally:
+                stream.close()
+
+        self._record_usage(provider, estimated_tokens, usage, stats)
+        return "".join(parts)
+
+    def _record_usage(
+        self,
+        provider: Provider,
+        estimated_tokens: int,
+        usage: Optional[Dict[str, int]],
+        stats: Dict[str, Any],
+    ) -> None:
+        """
+        Adds the provider-reported token usage to stats and corrects the
+        provider's rate limiter estimate.
+        """
+        if usage is None:
+            return
+        stats["prompt_tokens"] = stats.get("prompt_tokens", 0) + usage["prompt_tokens"]
+        stats["completion_tokens"] = stats.get("completion_tokens", 0) + usage["completion_tokens"]
+        registry.inc("lessonplan_llm_tokens_total", usage["prompt_tokens"], kind="prompt", provider=provider.name)
+        registry.inc("lessonplan_llm_tokens_total", usage["completion_tokens"], kind="completion", provider=provider.name)
+        if provider.limiter is not None and usage["total_tokens"]:
+            provider.limiter.reconcile(estimated_tokens, usage["total_tokens"])
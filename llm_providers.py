@@ -0,0 +1,221 @@
+# llm_providers.py
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+
+from config import (
+    GROQ_API_KEY,
+    GROQ_API_KEYS,
+    GROQ_MODEL,
+    GROQ_BASE_URL,
+    LLM_PROVIDERS,
+    LLM_TIMEOUT_SECONDS,
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_SECONDS,
+    LLM_RATE_LIMIT_ENABLED,
+    GROQ_REQUESTS_PER_MINUTE,
+    GROQ_TOKENS_PER_MINUTE,
+)
+from llm_resilience import CircuitBreaker, CircuitOpenError
+from rate_limiter import FairRateLimiter
+
+GROQ_OPENAI_PATH = "/openai/v1"
+GROQ_DEFAULT_HOST = "https://api.groq.com"
+
+
+class Provider:
+    """
+    One OpenAI-compatible backend (endpoint + key + model) with its own
+    connection pool, circuit breaker (health) and rate limiter, so each key's
+    quota is used independently.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        weight: float = 1.0,
+        requests_per_minute: int = GROQ_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = GROQ_TOKENS_PER_MINUTE,
+        client: Optional[OpenAI] = None,
+    ):
+        if weight <= 0:
+            raise ValueError(f"Provider {name}: weight must be positive")
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.weight = float(weight)
+        # Retries and failover are handled by the pool, not the SDK
+        self.client = client or OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            max_retries=0,
+            http_client=DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                ),
+            ),
+        )
+        self.breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+        self.limiter = (
+            FairRateLimiter(requests_per_minute, tokens_per_minute)
+            if LLM_RATE_LIMIT_ENABLED else None
+        )
+        # Cleared once the endpoint rejects response_format
+        self.structured_output = True
+        # Requests routed here and not finished yet (including rate-limit waits)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+
+    def load(self) -> float:
+        return self.in_flight / self.weight
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "weight": self.weight,
+            "state": self.breaker.state,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class ProviderPool:
+    """
+    Routes each request to the least-loaded healthy provider (in-flight
+    requests divided by weight). Providers whose circuit breaker is open are
+    skipped until their reset period is over. Safe to share between threads.
+    """
+
+    def __init__(self, providers: Sequence[Provider]):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        self.providers = list(providers)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Sequence[Provider] = ()) -> Provider:
+        """
+        Reserves a provider for one request; pair with release(). Raises
+        CircuitOpenError when every provider not in exclude is unhealthy.
+        """
+        with self._lock:
+            candidates = [
+                p for p in self.providers
+                if p not in exclude and p.breaker.state != "open"
+            ]
+            if not candidates:
+                raise CircuitOpenError("No healthy LLM provider available")
+            # Rotate the starting point so equally loaded providers take turns
+            n = len(self.providers)
+            start = self._next
+            self._next = (self._next + 1) % n
+            candidates.sort(key=lambda p: (p.load(), -p.weight, (self.providers.index(p) - start) % n))
+            provider = candidates[0]
+            provider.in_flight += 1
+            provider.requests += 1
+            return provider
+
+    def release(self, provider: Provider, failed: bool = False) -> None:
+        with self._lock:
+            provider.in_flight -= 1
+            if failed:
+                provider.failures += 1
+
+    def models(self) -> List[str]:
+        """
+        Distinct models served by the pool, in provider order.
+        """
+        return list(dict.fromkeys(p.model for p in self.providers))
+
+    def snapshot(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rate-limit queue info across providers: total depth and, for
+        session_id, its best position and estimated wait on any of them.
+        """
+        infos = [p.limiter.snapshot(session_id) for p in self.providers if p.limiter is not None]
+        info: Dict[str, Any] = {"queue_depth": sum(i["queue_depth"] for i in infos)}
+        if session_id is None:
+            return info
+        waiting = [i for i in infos if i.get("position")]
+        info["position"] = min((i["position"] for i in waiting), default=None)
+        if waiting:
+            info["estimated_wait_s"] = min(i.get("estimated_wait_s", 0.0) for i in waiting)
+        return info
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [p.status() for p in self.providers]
+
+
+def _groq_openai_base_url() -> str:
+    # GROQ_BASE_URL is a Groq-SDK style host; the OpenAI SDK needs the /openai/v1 prefix
+    return (GROQ_BASE_URL or GROQ_DEFAULT_HOST).rstrip("/") + GROQ_OPENAI_PATH
+
+
+def load_provider_configs() -> List[Dict[str, Any]]:
+    """
+    Provider settings from LLM_PROVIDERS (a JSON list of
+    {"name", "base_url", "api_key" | "api_key_env", "model", "weight",
+    "requests_per_minute", "tokens_per_minute"}), or else one Groq provider
+    per key in GROQ_API_KEY / GROQ_API_KEYS.
+    """
+    if LLM_PROVIDERS:
+        entries = json.loads(LLM_PROVIDERS)
+        configs = []
+        for n, entry in enumerate(entries, start=1):
+            api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", ""), "")
+            if not api_key:
+                raise ValueError(f"LLM provider {entry.get('name', n)} has no API key")
+            configs.append({
+                "name": entry.get("name") or f"provider-{n}",
+                "base_url": entry.get("base_url") or _groq_openai_base_url(),
+                "api_key": api_key,
+                "model": entry.get("model") or GROQ_MODEL,
+                "weight": float(entry.get("weight", 1.0)),
+                "requests_per_minute": int(entry.get("requests_per_minute", GROQ_REQUESTS_PER_MINUTE)),
+                "tokens_per_minute": int(entry.get("tokens_per_minute", GROQ_TOKENS_PER_MINUTE)),
+            })
+        return configs
+
+    keys = [k.strip() for k in [GROQ_API_KEY] + GROQ_API_KEYS.split(",") if k and k.strip()]
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        raise ValueError("GROQ_API_KEY not set")
+    return [
+        {
+            "name": "groq" if len(keys) == 1 else f"groq-{n}",
+            "base_url": _groq_openai_base_url(),
+            "api_key": key,
+            "model": GROQ_MODEL,
+        }
+        for n, key in enumerate(keys, start=1)
+    ]
+
+
+# -------- PROCESS-WIDE INSTANCE --------
+_shared_pool: Optional[ProviderPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_provider_pool() -> ProviderPool:
+    """
+    Returns the provider pool shared by every run and session.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProviderPool([Provider(**c) for c in load_provider_configs()])
+        return _shared_pool
@@ -0,0 +1,211 @@
+# llm_resilience.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from groq import APIConnectionError
+from openai import APIConnectionError as OpenAIConnectionError
+
+from config import (
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+)
+from hedging import Deadline
+from metrics import registry
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised without calling the provider while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive provider failures and fails
+    fast for reset_seconds; then lets a single trial call through
+    (half-open) and closes again on success.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError when no call may be made. Returns True when
+        this call is the half-open trial; the caller must then end it with
+        release_trial() whatever the outcome.
+        """
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "open" or (state == "half_open" and self._trial_in_flight):
+                raise CircuitOpenError("LLM provider is failing; circuit breaker is open")
+            if state == "half_open":
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self) -> None:
+        """
+        Ends a half-open trial that neither succeeded nor failed (e.g. a 429
+        or a cancelled call), so the next call can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Rate limits, timeouts, connection problems and 5xx responses are retried;
+    other 4xx responses (bad request, auth) are not.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return isinstance(error, (APIConnectionError, OpenAIConnectionError))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the provider via retry-after-ms / Retry-After
+    (seconds or HTTP date), if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter for the given (0-based) retry.
+    """
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retries(
+    fn: Callable[[], T],
+    breaker: Optional[CircuitBreaker] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    max_retries: int = LLM_MAX_RETRIES,
+    base_delay: float = LLM_BACKOFF_BASE_SECONDS,
+    max_delay: float = LLM_BACKOFF_MAX_SECONDS,
+    deadline: Optional[Deadline] = None,
+) -> T:
+    """
+    Calls fn(), retrying retryable errors with exponential backoff + jitter
+    (or the provider's Retry-After when given). Records attempts, retries,
+    time spent waiting and per-attempt latency into stats. No retry is
+    started that would only begin after deadline runs out.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("attempts", 0)
+    stats.setdefault("retries", 0)
+    stats.setdefault("retry_wait_s", 0.0)
+    stats.setdefault("attempt_latencies_s", [])
+
+    attempt = 0
+    while True:
+        trial = breaker.before_call() if breaker is not None else False
+
+        stats["attempts"] += 1
+        started = time.perf_counter()
+        try:
+            try:
+                result = fn()
+            finally:
+                if trial:
+                    breaker.release_trial()
+        except Exception as e:
+            stats["attempt_latencies_s"].append(time.perf_counter() - started)
+            retryable = is_retryable_error(e)
+            if getattr(e, "status_code", None) == 429:
+                outcome = "rate_limited"
+            else:
+                outcome = "retryable_error" if retryable else "error"
+            registry.inc("lessonplan_llm_attempts_total", outcome=outcome)
+            if breaker is not None:
+                if not retryable:
+                    # The provider answered (bad request, off-schema output, ...)
+                    breaker.record_success()
+                elif getattr(e, "status_code", None) != 429:
+                    # 429 means "slow down", not "provider broken"
+                    breaker.record_failure()
+            if not retryable or attempt >= max_retries:
+                stats["last_error"] = f"{type(e).__name__}: {e}"
+                raise
+
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            delay = min(delay, max_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline.expires_at():
+                stats["last_error"] = f"{type(e).__name__}: {e}"
+                raise
+            stats["retries"] += 1
+            registry.inc("lessonplan_llm_retries_total")
+            stats["retry_wait_s"] += delay
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        stats["attempt_latencies_s"].append(time.perf_counter() - started)
+        registry.inc("lessonplan_llm_attempts_total", outcome="ok")
+        if breaker is not None:
+            breaker.record_success()
+        return result
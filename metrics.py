@@ -0,0 +1,209 @@
+# metrics.py
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import METRICS_PORT, METRICS_HOST
+
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_HELP = {
+    "lessonplan_stage_duration_seconds": ("histogram", "Time spent per pipeline stage"),
+    "lessonplan_pdf_pages_extracted_total": ("counter", "PDF pages whose text was extracted"),
+    "lessonplan_boilerplate_tokens_removed_total": ("counter", "Prompt tokens saved by stripping page boilerplate"),
+    "lessonplan_compression_tokens_saved_total": ("counter", "Lesson-text tokens dropped by extractive compression"),
+    "lessonplan_llm_tokens_total": ("counter", "Tokens reported by the LLM provider"),
+    "lessonplan_llm_cache_lookups_total": ("counter", "LLM response cache lookups"),
+    "lessonplan_llm_attempts_total": ("counter", "LLM call attempts by outcome"),
+    "lessonplan_llm_retries_total": ("counter", "LLM calls retried after a retryable error"),
+    "lessonplan_llm_failovers_total": ("counter", "Requests moved to another provider after a failure"),
+    "lessonplan_llm_schema_retries_total": ("counter", "LLM replies regenerated for being off-schema"),
+    "lessonplan_lessons_total": ("counter", "Lessons finished by outcome"),
+    "lessonplan_export_renders_total": ("counter", "Chapters rendered to Word/ZIP (export cache misses)"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and duration histograms, exportable as
+    Prometheus text or JSON. Safe to share between threads.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._histograms[key] = hist
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        JSON-friendly view: {"counters": [...], "histograms": [...]}.
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": hist["count"],
+                    "sum": hist["sum"],
+                    "mean": hist["sum"] / hist["count"] if hist["count"] else 0.0,
+                    "buckets": dict(zip((str(b) for b in self.buckets), hist["buckets"])),
+                }
+                for (name, labels), hist in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, dict(hist, buckets=list(hist["buckets"])))
+                for key, hist in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, default_type: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            metric_type, help_text = METRIC_HELP.get(name, (default_type, name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), hist in histograms:
+            describe(name, "histogram")
+            for bound, count in zip(self.buckets, hist["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# -------- SPANS --------
+@contextmanager
+def span(stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """
+    Times a pipeline stage into the stage-duration histogram and, when given,
+    adds the duration to timings[stage] (a per-lesson or per-run breakdown).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("lessonplan_stage_duration_seconds", elapsed, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage: str):
+    """
+    Decorator form of span() for functions with no per-run context.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -------- HTTP ENDPOINT --------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = registry.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(registry.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves /metrics (Prometheus text) and /metrics.json on a background
+    thread. Does nothing when port is 0; safe to call on every rerun.
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
@@ -1,20 +1,205 @@
 # pdf_utils.py
-from typing import Tuple
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+from boilerplate import strip_page_boilerplate
+from config import PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, BOILERPLATE_STRIPPING
+from metrics import registry, timed
+
+
+def get_page_count(file_bytes: bytes) -> int:
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+# -------- PAGE SELECTION --------
+_PAGE_PREFIX_RE = re.compile(r"^\s*(?:pages?|pp?)\.?\s*", re.IGNORECASE)
+_PAGE_PART_RE = re.compile(r"^(\d+)(?:\s*[-\u2013\u2014]\s*(\d+))?$")
+
+
+def parse_page_selection(page_no: Optional[str]) -> Optional[List[Tuple[int, int]]]:
     """
-    Extracts text from a PDF file (bytes) using PyMuPDF.
-    Returns full text as a single string.
+    Parses a "Page No / Range" value such as "12-18, 22" or "pp. 112–131"
+    into sorted, merged 1-based inclusive ranges: [(12, 18), (22, 22)].
+    Returns None (= whole document) when the value is empty or is not a
+    plain list of page numbers and ranges.
+    """
+    if not page_no or not page_no.strip():
+        return None
+
+    body = _PAGE_PREFIX_RE.sub("", page_no.strip())
+    ranges = []
+    for part in re.split(r"[,;]", body):
+        part = part.strip()
+        if not part:
+            continue
+        match = _PAGE_PART_RE.match(part)
+        if not match:
+            return None
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if first > last:
+            first, last = last, first
+        ranges.append((max(1, first), max(1, last)))
+
+    if not ranges:
+        return None
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for first, last in ranges[1:]:
+        prev_first, prev_last = merged[-1]
+        if first <= prev_last + 1:
+            merged[-1] = (prev_first, max(prev_last, last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _page_indices(
+    num_pages: int,
+    page_ranges: Optional[List[Tuple[int, int]]],
+) -> List[int]:
+    """
+    0-based page indices covered by page_ranges, clipped to the document.
+    A selection entirely outside the document means the whole document.
+    """
+    indices = []
+    for first, last in page_ranges or []:
+        indices.extend(range(first - 1, min(last, num_pages)))
+    return indices or list(range(num_pages))
+
+
+def resolve_page_selection(
+    file_bytes: bytes,
+    page_no: Optional[str],
+) -> Tuple[Optional[List[Tuple[int, int]]], Optional[str]]:
+    """
+    parse_page_selection for a given PDF: (page_ranges, warning), with the
+    ranges clipped to the document. Pages that all fall outside it -
+    typically printed textbook page numbers entered for a chapter-sized
+    PDF - select the whole document (None); a selection that only partly
+    extends past the end keeps the pages that exist. Either way the
+    warning says what was dropped.
+    """
+    page_ranges = parse_page_selection(page_no)
+    if page_ranges is None:
+        return None, None
+    num_pages = get_page_count(file_bytes)
+    clipped = [(first, min(last, num_pages)) for first, last in page_ranges if first <= num_pages]
+    if not clipped:
+        return None, (
+            f"Page selection \"{page_no.strip()}\" is outside this PDF ({num_pages} pages), "
+            "so the whole document was used."
+        )
+    if clipped != page_ranges:
+        return clipped, (
+            f"Page selection \"{page_no.strip()}\" goes past the end of this PDF ({num_pages} pages); "
+            f"pages after {num_pages} were skipped."
+        )
+    return page_ranges, None
+
+
+def iter_page_texts(
+    file_bytes: bytes,
+    page_indices: Optional[Sequence[int]] = None,
+) -> Iterator[str]:
+    """
+    Yields the cleaned text of each requested page (0-based indices,
+    default all pages), one page at a time. Pages with no text are skipped.
     """
     doc = fitz.open(stream=file_bytes, filetype="pdf")
-    texts = []
-    for page in doc:
-        text = page.get_text("text")
-        texts.append(text)
-    doc.close()
-    full_text = "\n".join(texts)
-    return clean_extracted_text(full_text)
+    try:
+        if page_indices is None:
+            page_indices = range(doc.page_count)
+        for page_index in page_indices:
+            text = clean_extracted_text(doc.load_page(page_index).get_text("text"))
+            if text:
+                yield text
+    finally:
+        doc.close()
+
+
+# -------- PROCESS POOL WORKERS --------
+# Each worker receives the PDF bytes once (initializer) and opens its own document.
+# Workers are spawned, not forked: forking copies the parent's threads and locks
+# (Streamlit, the job queue, the LLM client) and PyMuPDF's state into the child.
+_worker_file_bytes: Optional[bytes] = None
+
+
+def _init_extract_worker(file_bytes: bytes) -> None:
+    global _worker_file_bytes
+    _worker_file_bytes = file_bytes
+
+
+def _extract_pages(page_indices: List[int]) -> List[str]:
+    return list(iter_page_texts(_worker_file_bytes, page_indices))
+
+
+def _split_evenly(items: List[int], num_parts: int) -> List[List[int]]:
+    size, extra = divmod(len(items), num_parts)
+    parts = []
+    start = 0
+    for i in range(num_parts):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            parts.append(items[start:stop])
+        start = stop
+    return parts
+
+
+@timed("pdf_extract")
+def extract_page_texts(
+    file_bytes: bytes,
+    page_ranges: Optional[List[Tuple[int, int]]] = None,
+    workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Extracts the cleaned text of each page of a PDF file (bytes) using
+    PyMuPDF, in document order (pages with no text are skipped).
+    page_ranges (1-based inclusive, see parse_page_selection) limits
+    extraction to those pages; None extracts the whole document.
+    Large selections are split into page ranges across a process pool.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    page_indices = _page_indices(get_page_count(file_bytes), page_ranges)
+    registry.inc("lessonplan_pdf_pages_extracted_total", len(page_indices))
+
+    if workers <= 1 or len(page_indices) < PDF_PARALLEL_MIN_PAGES:
+        return list(iter_page_texts(file_bytes, page_indices))
+
+    parts = _split_evenly(page_indices, workers)
+    with ProcessPoolExecutor(
+        max_workers=len(parts),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_extract_worker,
+        initargs=(file_bytes,),
+    ) as pool:
+        # map() preserves part order, so pages come back in document order
+        return [text for page_texts in pool.map(_extract_pages, parts) for text in page_texts]
+
+
+def extract_text_from_pdf(
+    file_bytes: bytes,
+    page_ranges: Optional[List[Tuple[int, int]]] = None,
+    workers: Optional[int] = None,
+) -> str:
+    """
+    Extracts text from a PDF file (bytes) using PyMuPDF.
+    Returns full text as a single string, with running headers/footers,
+    page numbers and hyphenated line breaks removed (see boilerplate.py)
+    unless BOILERPLATE_STRIPPING is off.
+    """
+    pages = extract_page_texts(file_bytes, page_ranges, workers)
+    if BOILERPLATE_STRIPPING:
+        pages, _ = strip_page_boilerplate(pages)
+    return "\n\n".join(pages)
 
 
 def clean_extracted_text(text: str) -> str:
@@ -0,0 +1,114 @@
+# preprocess_cache.py
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from boilerplate import strip_page_boilerplate
+from pdf_utils import extract_page_texts, rough_word_count
+from chunking import split_into_lesson_chunks, plan_token_chunks, split_into_topic_chunks
+from config import (
+    PREPROCESS_TEXT_CACHE_SIZE,
+    PREPROCESS_CHUNK_CACHE_SIZE,
+    CHUNKING_MODE,
+    BOILERPLATE_STRIPPING,
+)
+from lru_cache import LRUCache
+from metrics import registry
+from tokens import count_tokens
+
+
+# -------- PROCESS-WIDE CACHES (shared by every Streamlit session) --------
+_text_cache = LRUCache(PREPROCESS_TEXT_CACHE_SIZE)
+_chunk_cache = LRUCache(PREPROCESS_CHUNK_CACHE_SIZE)
+
+
+def file_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _pages_key(page_ranges: Optional[List[Tuple[int, int]]]) -> Optional[Tuple[Tuple[int, int], ...]]:
+    return tuple(page_ranges) if page_ranges is not None else None
+
+
+def get_document_text(
+    file_bytes: bytes,
+    page_ranges: Optional[List[Tuple[int, int]]] = None,
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Extracted + cleaned text and word count for a PDF (optionally only the
+    given page ranges), cached by (SHA-256 of its bytes, page ranges).
+    doc["cleanup"] reports what boilerplate stripping removed, including
+    words and tokens before/after.
+    """
+    digest = digest or file_digest(file_bytes)
+    return _text_cache.get_or_compute(
+        (digest, _pages_key(page_ranges)),
+        lambda: _extract_document(file_bytes, page_ranges, digest),
+    )
+
+
+def _extract_document(
+    file_bytes: bytes,
+    page_ranges: Optional[List[Tuple[int, int]]],
+    digest: str,
+) -> Dict[str, Any]:
+    pages = extract_page_texts(file_bytes, page_ranges)
+    # Counted page by page, so the uncleaned text is never held as one string
+    cleanup: Dict[str, Any] = {
+        "enabled": BOILERPLATE_STRIPPING,
+        "words_before": sum(rough_word_count(page) for page in pages),
+        "tokens_before": sum(count_tokens(page) for page in pages),
+    }
+    cleanup["words_after"], cleanup["tokens_after"] = cleanup["words_before"], cleanup["tokens_before"]
+    if BOILERPLATE_STRIPPING:
+        pages, report = strip_page_boilerplate(pages)
+        cleanup.update(report)
+        cleanup["words_after"] = sum(rough_word_count(page) for page in pages)
+        cleanup["tokens_after"] = sum(count_tokens(page) for page in pages)
+    text = "\n\n".join(pages)
+    registry.inc(
+        "lessonplan_boilerplate_tokens_removed_total",
+        cleanup["tokens_before"] - cleanup["tokens_after"],
+    )
+
+    return {"digest": digest, "text": text, "word_count": cleanup["words_after"], "cleanup": cleanup}
+
+
+def get_chunk_plan(
+    file_bytes: bytes,
+    num_lessons: int,
+    page_ranges: Optional[List[Tuple[int, int]]] = None,
+    digest: Optional[str] = None,
+    mode: Optional[str] = None,
+    topic_names: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Lesson chunks for a PDF, cached by (SHA-256 of its bytes, page ranges,
+    lesson count, chunking mode, topic names for "topics" mode).
+    "tokens" mode also carries the token plan (chunk_tokens, token_budget, ...)
+    from chunking.plan_token_chunks; "topics" mode aligns one chunk per topic.
+    """
+    mode = mode or CHUNKING_MODE
+    digest = digest or file_digest(file_bytes)
+    topics_key = tuple(topic_names or ()) if mode == "topics" else None
+    key = (digest, _pages_key(page_ranges), num_lessons, mode, topics_key)
+
+    def compute() -> Dict[str, Any]:
+        text = get_document_text(file_bytes, page_ranges, digest)["text"]
+        if mode == "tokens":
+            plan = plan_token_chunks(text, num_lessons)
+        elif mode == "topics":
+            plan = {"chunks": split_into_topic_chunks(text, list(topics_key))}
+        elif mode == "words":
+            plan = {"chunks": split_into_lesson_chunks(text, num_lessons)}
+        else:
+            raise ValueError(f"Unknown chunking mode: {mode}")
+        plan["mode"] = mode
+        return plan
+
+    cached = _chunk_cache.get_or_compute(key, compute)
+    return dict(cached, chunks=list(cached["chunks"]))
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"text": _text_cache.stats(), "chunks": _chunk_cache.stats()}
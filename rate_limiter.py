@@ -0,0 +1,171 @@
+# rate_limiter.py
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from hedging import RequestCancelled
+
+# How often a waiter with a cancel event checks it
+CANCEL_POLL_SECONDS = 0.25
+
+
+class _Waiter:
+    __slots__ = ("session_id", "tokens", "enqueued_at")
+
+    def __init__(self, session_id: str, tokens: int):
+        self.session_id = session_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class FairRateLimiter:
+    """
+    Limiter for one API key's requests/minute and tokens/minute (two token
+    buckets). Callers that cannot be served immediately are queued instead
+    of failing; sessions are served round-robin so one teacher's burst
+    cannot starve the others, and requests within a session stay FIFO.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self._request_rate = requests_per_minute / 60.0
+        self._token_rate = tokens_per_minute / 60.0
+        self._request_level = self.request_capacity
+        self._token_level = self.token_capacity
+        self._refilled_at = time.monotonic()
+
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._rotation: Deque[str] = deque()
+        self._cond = threading.Condition()
+
+    # -------- BUCKETS (caller holds the lock) --------
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._request_level = min(self.request_capacity, self._request_level + elapsed * self._request_rate)
+        self._token_level = min(self.token_capacity, self._token_level + elapsed * self._token_rate)
+
+    def _time_until_available(self, tokens: int) -> float:
+        request_wait = max(0.0, (1.0 - self._request_level) / self._request_rate)
+        token_wait = max(0.0, (tokens - self._token_level) / self._token_rate)
+        return max(request_wait, token_wait)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        if not self._rotation:
+            return None
+        return self._queues[self._rotation[0]][0]
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        session_queue = self._queues[waiter.session_id]
+        session_queue.popleft()
+        self._rotation.remove(waiter.session_id)
+        if session_queue:
+            # Back of the line: every other waiting session gets a turn first
+            self._rotation.append(waiter.session_id)
+        else:
+            del self._queues[waiter.session_id]
+
+    def _remove(self, waiter: _Waiter) -> None:
+        session_queue = self._queues[waiter.session_id]
+        session_queue.remove(waiter)
+        if not session_queue:
+            del self._queues[waiter.session_id]
+            self._rotation.remove(waiter.session_id)
+
+    # -------- PUBLIC API --------
+    def acquire(
+        self,
+        session_id: str,
+        tokens: int,
+        cancel: Optional[threading.Event] = None,
+    ) -> float:
+        """
+        Blocks until this session's turn comes and both buckets can cover one
+        request of `tokens` estimated tokens. Returns the time spent waiting.
+        If cancel is set while waiting (the request timed out or its hedged
+        twin won), the waiter leaves the queue without taking any quota and
+        RequestCancelled is raised.
+        """
+        tokens = int(min(max(tokens, 0), self.token_capacity))
+        waiter = _Waiter(session_id, tokens)
+
+        with self._cond:
+            if session_id not in self._queues:
+                self._queues[session_id] = deque()
+                self._rotation.append(session_id)
+            self._queues[session_id].append(waiter)
+
+            while True:
+                if cancel is not None and cancel.is_set():
+                    self._remove(waiter)
+                    self._cond.notify_all()
+                    raise RequestCancelled("Request cancelled while waiting for the rate limiter")
+                now = time.monotonic()
+                self._refill(now)
+                timeout = None
+                if self._next_waiter() is waiter:
+                    timeout = self._time_until_available(tokens)
+                    if timeout <= 0.0:
+                        self._request_level -= 1.0
+                        self._token_level -= tokens
+                        self._dequeue(waiter)
+                        self._cond.notify_all()
+                        return now - waiter.enqueued_at
+                if cancel is not None:
+                    timeout = CANCEL_POLL_SECONDS if timeout is None else min(timeout, CANCEL_POLL_SECONDS)
+                self._cond.wait(timeout)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Corrects the token bucket once the provider reports real usage.
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            self._token_level = min(
+                self.token_capacity,
+                self._token_level + estimated_tokens - actual_tokens,
+            )
+            self._cond.notify_all()
+
+    def _service_order(self) -> List[_Waiter]:
+        """
+        Waiters in the order round-robin would serve them. Caller holds the lock.
+        """
+        order = []
+        sessions = [self._queues[s] for s in self._rotation]
+        depth = max((len(q) for q in sessions), default=0)
+        for round_no in range(depth):
+            for session_queue in sessions:
+                if round_no < len(session_queue):
+                    order.append(session_queue[round_no])
+        return order
+
+    def snapshot(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue depth plus, for session_id, its position (1 = next) and an
+        estimate of how long until its first queued request is sent.
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            order = self._service_order()
+            info: Dict[str, Any] = {"queue_depth": len(order)}
+            if session_id is None:
+                return info
+
+            position = next(
+                (i for i, w in enumerate(order) if w.session_id == session_id), None
+            )
+            info["position"] = None if position is None else position + 1
+            if position is not None:
+                ahead = order[:position + 1]
+                requests_needed = len(ahead) - self._request_level
+                tokens_needed = sum(w.tokens for w in ahead) - self._token_level
+                info["estimated_wait_s"] = max(
+                    0.0,
+                    requests_needed / self._request_rate,
+                    tokens_needed / self._token_rate,
+                )
+            return info
+
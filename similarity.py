@@ -0,0 +1,67 @@
+# similarity.py
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Very small list: enough to stop function words dominating short topic names
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or
+that the their this to was were which with what when where who how why
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def build_vocabulary(documents: List[str]) -> Dict[str, int]:
+    vocabulary: Dict[str, int] = {}
+    for doc in documents:
+        for term in tokenize(doc):
+            vocabulary.setdefault(term, len(vocabulary))
+    return vocabulary
+
+
+def term_counts(documents: List[str], vocabulary: Dict[str, int]) -> np.ndarray:
+    """
+    Dense (documents x vocabulary) term-count matrix; out-of-vocabulary terms are ignored.
+    """
+    rows, cols = [], []
+    for i, doc in enumerate(documents):
+        for term in tokenize(doc):
+            j = vocabulary.get(term)
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+
+    counts = np.zeros((len(documents), len(vocabulary)), dtype=np.float64)
+    if rows:
+        np.add.at(counts, (np.asarray(rows), np.asarray(cols)), 1.0)
+    return counts
+
+
+def tfidf_matrix(
+    documents: List[str],
+    vocabulary: Optional[Dict[str, int]] = None,
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+    """
+    L2-normalised TF-IDF rows (sublinear tf, smoothed idf) for documents.
+    Returns (matrix, idf, vocabulary). Pass a vocabulary to score only those
+    terms, e.g. the words of the topic names.
+    """
+    vocabulary = build_vocabulary(documents) if vocabulary is None else vocabulary
+    counts = term_counts(documents, vocabulary)
+
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0
+
+    matrix = np.log1p(counts) * idf
+    return normalize_rows(matrix), idf, vocabulary
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0.0, 1.0, norms)
@@ -0,0 +1,36 @@
+# tests/test_batch_generate.py
+from batch_generate import job_key
+from config import CHUNKING_MODE, LESSON_COMPRESSION_TARGET_TOKENS, LLM_BATCH_MODE
+
+JOB = {
+    "pdf": "chapters/ch1.pdf",
+    "grade": "6",
+    "chapter_name": "Seeds",
+    "topic_names": ["Germination", "Dispersal"],
+    "page_no": "",
+    "num_lessons": None,
+}
+
+
+def test_key_ignores_pdf_path_but_not_content():
+    moved = dict(JOB, pdf="elsewhere/ch1.pdf")
+    assert job_key(JOB, "abc") == job_key(moved, "abc")
+    assert job_key(JOB, "abc") != job_key(JOB, "abd")
+
+
+def test_key_changes_with_lesson_inputs():
+    edited = dict(JOB, topic_names=["Germination", "Pollination"])
+    assert job_key(JOB, "abc") != job_key(edited, "abc")
+
+
+def test_key_changes_with_run_options():
+    base = job_key(JOB, "abc", "words", 0, False)
+    assert base != job_key(JOB, "abc", "tokens", 0, False)
+    assert base != job_key(JOB, "abc", "words", 500, False)
+    assert base != job_key(JOB, "abc", "words", 0, True)
+
+
+def test_unset_options_key_as_their_defaults():
+    assert job_key(JOB, "abc") == job_key(
+        JOB, "abc", CHUNKING_MODE, LESSON_COMPRESSION_TARGET_TOKENS, LLM_BATCH_MODE
+    )
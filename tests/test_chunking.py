@@ -0,0 +1,63 @@
+# tests/test_chunking.py
+import itertools
+import random
+
+import numpy as np
+
+from chunking import _align_spans, _balanced_groups
+
+
+def _brute_force_max(weights, num_groups):
+    # Smallest possible heaviest span over every way to cut into num_groups spans
+    n = len(weights)
+    best = None
+    for cuts in itertools.combinations(range(1, n), num_groups - 1):
+        bounds = (0,) + cuts + (n,)
+        heaviest = max(sum(weights[a:b]) for a, b in zip(bounds, bounds[1:]))
+        best = heaviest if best is None else min(best, heaviest)
+    return best
+
+
+def test_balanced_groups_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(300):
+        weights = [rng.randint(1, 30) for _ in range(rng.randint(1, 9))]
+        num_groups = rng.randint(1, len(weights) + 2)
+        spans = _balanced_groups(weights, num_groups)
+
+        expected_groups = min(num_groups, len(weights))
+        assert len(spans) == expected_groups
+        assert spans[0][0] == 0 and spans[-1][1] == len(weights)
+        assert all(start < end for start, end in spans)
+        assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+        heaviest = max(sum(weights[start:end]) for start, end in spans)
+        assert heaviest == _brute_force_max(weights, expected_groups), (weights, num_groups, spans)
+
+
+def test_balanced_groups_edge_cases():
+    assert _balanced_groups([], 3) == []
+    assert _balanced_groups([5, 5], 0) == []
+    assert _balanced_groups([4, 4, 4, 4], 2) == [(0, 2), (2, 4)]
+
+
+def _span_score(scores, spans):
+    return sum(scores[start:end, t].sum() for t, (start, end) in enumerate(spans))
+
+
+def test_align_spans_matches_brute_force():
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        num_units = int(rng.integers(1, 9))
+        num_topics = int(rng.integers(1, num_units + 1))
+        scores = rng.normal(size=(num_units, num_topics))
+        spans = _align_spans(scores)
+
+        assert len(spans) == num_topics
+        assert spans[0][0] == 0 and spans[-1][1] == num_units
+        assert all(start < end for start, end in spans)
+        assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+        best = max(
+            _span_score(scores, list(zip((0,) + cuts, cuts + (num_units,))))
+            for cuts in itertools.combinations(range(1, num_units), num_topics - 1)
+        )
+        assert np.isclose(_span_score(scores, spans), best), (scores, spans)
@@ -0,0 +1,80 @@
+# tests/test_circuit_breaker.py
+from types import SimpleNamespace
+
+import pytest
+
+from llm_client import LessonPlanLLMClient
+from llm_providers import Provider, ProviderPool
+from llm_resilience import CircuitBreaker, CircuitOpenError, call_with_retries
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_rate_limited_trial_is_released():
+    breaker = _half_open_breaker()
+    replies = iter([_StatusError(429), "ok"])
+
+    def fn():
+        reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    assert call_with_retries(fn, breaker, max_retries=1, base_delay=0.0, max_delay=0.0) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_trial_is_released_when_retries_run_out():
+    breaker = _half_open_breaker()
+
+    def fn():
+        raise _StatusError(429)
+
+    with pytest.raises(_StatusError):
+        call_with_retries(fn, breaker, max_retries=0)
+    # Another trial may go through rather than failing fast for good
+    assert breaker.before_call() is True
+    breaker.release_trial()
+
+
+def test_trial_in_flight_blocks_other_calls():
+    breaker = _half_open_breaker()
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release_trial()
+    assert breaker.before_call() is True
+
+
+def test_provider_trial_is_released_after_429():
+    replies = [_StatusError(429), "ok"]
+
+    def create(**kwargs):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=None)
+
+    sdk = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    provider = Provider("stub", "http://stub.invalid", "key", "model", client=sdk)
+    provider.limiter = None
+    provider.breaker = _half_open_breaker()
+    client = LessonPlanLLMClient.__new__(LessonPlanLLMClient)
+    client.pool = ProviderPool([provider])
+    messages = [{"role": "user", "content": "hi"}]
+
+    with pytest.raises(_StatusError):
+        client._create_completion(messages, 0.0, "session", {})
+    assert client._create_completion(messages, 0.0, "session", {}) == ("ok", "model")
+    assert provider.breaker.state == "closed"
@@ -0,0 +1,87 @@
+# tests/test_deadline.py
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import llm_client
+from hedging import Deadline, HedgePolicy
+from llm_client import LessonPlanLLMClient
+from llm_providers import Provider, ProviderPool
+from rate_limiter import FairRateLimiter
+
+LESSON = dict(
+    lesson_text="Plants make food from sunlight.",
+    grade="6",
+    chapter_name="Plants",
+    page_no="",
+    domains=None,
+    curricular_goals=None,
+    competencies=None,
+    extra_sections=[],
+    include_learning_outcomes=True,
+    include_teaching_aids=False,
+    include_strategy=False,
+    include_interdisciplinary=False,
+    include_extended=False,
+    use_cache=False,
+)
+
+
+def test_clock_stops_while_every_request_is_queued():
+    deadline = Deadline(0.2)
+    with deadline.request():
+        with deadline.queued():
+            time.sleep(0.3)
+            assert not deadline.expired()
+        assert not deadline.expired()
+        time.sleep(0.25)
+        assert deadline.expired()
+
+
+def test_clock_runs_while_another_request_is_sending():
+    deadline = Deadline(0.2)
+    with deadline.request(), deadline.request():
+        with deadline.queued():
+            time.sleep(0.25)
+            assert deadline.expired()
+
+
+def test_saturated_limiter_does_not_use_up_the_deadline(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_LESSON_DEADLINE_SECONDS", 0.2)
+    monkeypatch.setattr(llm_client, "build_response_format", lambda sections: None)
+    monkeypatch.setattr(llm_client, "count_tokens", lambda text: len(text.split()))
+
+    def create(**kwargs):
+        reply = json.dumps({"learning_outcomes": ["Explain photosynthesis"]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))], usage=None)
+
+    sdk = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    provider = Provider("stub", "http://stub.invalid", "key", "model", client=sdk)
+    # 4 requests/second, burst already spent: the last lesson queues for ~1s
+    provider.limiter = FairRateLimiter(240, 10 ** 9)
+    for _ in range(240):
+        provider.limiter.acquire("other", 1)
+    client = LessonPlanLLMClient.__new__(LessonPlanLLMClient)
+    client.pool = ProviderPool([provider])
+    client.cache = None
+    client.hedge_policy = HedgePolicy(enabled=False)
+
+    results, errors = {}, []
+
+    def run(n: int) -> None:
+        try:
+            results[n] = client.generate_lesson_plan_fields(
+                topic_name=f"Topic {n}", lesson_plan_no=n, session_id="teacher", **LESSON
+            )
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(1, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sorted(results) == [1, 2, 3, 4]
@@ -0,0 +1,58 @@
+# tests/test_incremental.py
+from incremental import lesson_fingerprint, merge_lesson, plan_lesson_update
+
+BASE = ["grade", "chapter_name", "page_no", "topic_name", "lesson_plan_no"]
+SECTIONS = BASE + ["learning_outcomes", "teaching_aids"]
+LESSON = {"learning_outcomes": ["LO"], "teaching_aids": ["Chart"], "grade": "6"}
+
+
+def _fingerprint(chunk="Plants make food.", topic="Photosynthesis", sections=SECTIONS, extras=(), compress=0):
+    return lesson_fingerprint(chunk, topic, list(sections), list(extras), compress)
+
+
+def test_fingerprint_is_stable():
+    assert _fingerprint() == _fingerprint()
+    assert set(_fingerprint()["sections"]) == {"learning_outcomes", "teaching_aids"}
+
+
+def test_content_changes_with_text_topic_and_compression():
+    content = _fingerprint()["content"]
+    assert _fingerprint(chunk="Plants make food!")["content"] != content
+    assert _fingerprint(topic="Respiration")["content"] != content
+    assert _fingerprint(compress=400)["content"] != content
+    # The section set is not part of "content"
+    assert _fingerprint(sections=BASE)["content"] == content
+
+
+def test_extra_section_hash_follows_its_definition():
+    extra = {"title": "Field Trip", "content": "Visit a farm"}
+    sections = SECTIONS + ["field_trip"]
+    before = _fingerprint(sections=sections, extras=[extra])["sections"]
+    after = _fingerprint(sections=sections, extras=[dict(extra, content="Visit a park")])["sections"]
+    assert before["field_trip"] != after["field_trip"]
+    assert before["learning_outcomes"] == after["learning_outcomes"]
+
+
+def test_plan_lesson_update_actions():
+    old = _fingerprint()
+    assert plan_lesson_update(None, old, old) == {"action": "generate"}
+    assert plan_lesson_update({"error": "boom"}, old, old) == {"action": "generate"}
+    assert plan_lesson_update(LESSON, old, _fingerprint(topic="Respiration")) == {"action": "generate"}
+    assert plan_lesson_update(LESSON, old, old) == {"action": "reuse"}
+
+    extra = {"title": "Field Trip", "content": "Visit a farm"}
+    new = _fingerprint(sections=BASE + ["learning_outcomes", "field_trip"], extras=[extra])
+    assert plan_lesson_update(LESSON, old, new) == {
+        "action": "update", "drop": ["teaching_aids"], "add": ["field_trip"],
+    }
+
+
+def test_section_missing_from_old_reply_is_added():
+    old = _fingerprint()
+    partial = {"learning_outcomes": ["LO"]}
+    assert plan_lesson_update(partial, old, old) == {"action": "update", "drop": [], "add": ["teaching_aids"]}
+
+
+def test_merge_lesson_keeps_display_order():
+    merged = merge_lesson(LESSON, {"field_trip": "Farm"}, ["teaching_aids"], BASE + ["field_trip", "learning_outcomes"])
+    assert list(merged.items()) == [("field_trip", "Farm"), ("learning_outcomes", ["LO"])]
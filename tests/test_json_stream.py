@@ -0,0 +1,53 @@
+# tests/test_json_stream.py
+import json
+import random
+
+from json_stream import IncrementalJSONObjectParser
+
+REPLY = json.dumps({
+    "learning_outcomes": ["Explain {photosynthesis}, with examples", "Name the \"inputs\""],
+    "teaching_aids": {"charts": ["Leaf, cross-section"], "count": 2},
+    "strategy_pedagogy": "Group work \\ discussion [30 min]",
+    "extended_learning_assignment": "Grow a bean plant 🌱",
+})
+
+
+def _feed_all(fragments):
+    parser = IncrementalJSONObjectParser()
+    members = []
+    for fragment in fragments:
+        members.extend(parser.feed(fragment))
+    return parser, members
+
+
+def test_members_match_full_parse_for_any_fragmenting():
+    expected = list(json.loads(REPLY).items())
+    rng = random.Random(11)
+    for _ in range(200):
+        text = "Here is the lesson plan:\n" + REPLY + "\nHope this helps!"
+        fragments, i = [], 0
+        while i < len(text):
+            step = rng.randint(1, 12)
+            fragments.append(text[i:i + step])
+            i += step
+        parser, members = _feed_all(fragments)
+        assert members == expected
+        assert parser.started and parser.finished
+
+
+def test_member_is_returned_once_its_value_is_closed():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"a": [1, 2') == []
+    assert parser.feed('], "b": "x, y') == [("a", [1, 2])]
+    assert parser.feed('"}') == [("b", "x, y")]
+
+
+def test_unparseable_member_is_skipped():
+    _, members = _feed_all(['{"a": tru, "b": 1}'])
+    assert members == [("b", 1)]
+
+
+def test_text_without_object_yields_nothing():
+    parser, members = _feed_all(["no json here"])
+    assert members == []
+    assert not parser.started
@@ -0,0 +1,31 @@
+# tests/test_llm_cache.py
+from llm_cache import LLMResponseCache
+from llm_client import LessonPlanLLMClient
+from llm_providers import Provider, ProviderPool
+
+MESSAGES = [{"role": "user", "content": "Generate a lesson plan"}]
+FORMAT = {"type": "json_object"}
+
+
+def _client(tmp_path, models) -> LessonPlanLLMClient:
+    client = LessonPlanLLMClient.__new__(LessonPlanLLMClient)
+    client.pool = ProviderPool([
+        Provider(f"p{n}", "http://stub.invalid", "key", model) for n, model in enumerate(models)
+    ])
+    client.cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), 1 << 20, 3600)
+    return client
+
+
+def test_reply_is_found_while_its_model_is_in_the_pool(tmp_path):
+    client = _client(tmp_path, ["model-a", "model-b"])
+    client._cache_put("model-b", MESSAGES, 0.4, FORMAT, '{"x": 1}')
+    assert client._cache_get(MESSAGES, 0.4, FORMAT, True, {}) == '{"x": 1}'
+    assert client._cache_get(MESSAGES, 0.4, FORMAT, False, {}) is None
+
+
+def test_reply_from_another_model_is_not_replayed(tmp_path):
+    writer = _client(tmp_path, ["model-b"])
+    writer._cache_put("model-b", MESSAGES, 0.4, FORMAT, '{"x": 1}')
+
+    reader = _client(tmp_path, ["model-a"])
+    assert reader._cache_get(MESSAGES, 0.4, FORMAT, True, {}) is None
@@ -0,0 +1,135 @@
+# tests/test_llm_client.py
+import json
+from types import SimpleNamespace
+
+import llm_client
+from hedging import HedgePolicy
+from llm_client import LessonPlanLLMClient
+from llm_providers import Provider, ProviderPool
+
+LESSON = dict(
+    lesson_text="Plants make food from sunlight.",
+    grade="6",
+    chapter_name="Plants",
+    topic_name="Photosynthesis",
+    page_no="",
+    lesson_plan_no=1,
+    domains=None,
+    curricular_goals=None,
+    competencies=None,
+    extra_sections=[],
+    include_learning_outcomes=True,
+    include_teaching_aids=False,
+    include_strategy=False,
+    include_interdisciplinary=False,
+    include_extended=False,
+    use_cache=False,
+)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Stream:
+    def __init__(self, text: str):
+        self._chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 8]))], usage=None)
+            for i in range(0, len(text), 8)
+        ]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def _client(create) -> LessonPlanLLMClient:
+    sdk = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    provider = Provider("stub", "http://stub.invalid", "key", "model", client=sdk)
+    provider.limiter = None
+    client = LessonPlanLLMClient.__new__(LessonPlanLLMClient)
+    client.pool = ProviderPool([provider])
+    client.cache = None
+    client.hedge_policy = HedgePolicy(enabled=False)
+    return client
+
+
+def _reply(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+def test_structured_output_is_not_streamed(monkeypatch):
+    monkeypatch.setattr(llm_client, "build_response_format", lambda sections: {"type": "json_object"})
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if kwargs.get("stream") and "response_format" in kwargs:
+            raise _StatusError(400, "response_format does not support streaming")
+        return _reply(json.dumps({"learning_outcomes": ["Explain photosynthesis"]}))
+
+    shown = {}
+    lesson = _client(create).generate_lesson_plan_fields(**LESSON, on_section=shown.__setitem__)
+    assert [c.get("stream", False) for c in calls] == [False]
+    assert lesson["learning_outcomes"] == ["Explain photosynthesis"]
+    assert shown == {"learning_outcomes": ["Explain photosynthesis"]}
+
+
+def test_rejected_response_format_is_dropped(monkeypatch):
+    monkeypatch.setattr(llm_client, "build_response_format", lambda sections: {"type": "json_object"})
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if "response_format" in kwargs:
+            raise _StatusError(400, "response_format is not supported by this model")
+        return _reply(json.dumps({"learning_outcomes": ["Explain photosynthesis"]}))
+
+    client = _client(create)
+    for _ in range(2):
+        lesson = client.generate_lesson_plan_fields(**LESSON)
+        assert lesson["learning_outcomes"] == ["Explain photosynthesis"]
+    # Rejected once, then never sent to that provider again
+    assert ["response_format" in c for c in calls] == [True, False, False]
+
+
+def test_last_off_schema_attempt_is_filtered(monkeypatch):
+    monkeypatch.setattr(llm_client, "build_response_format", lambda sections: {"type": "json_object"})
+    monkeypatch.setattr(llm_client, "LLM_SCHEMA_RETRIES", 1)
+    reply = {"learning_outcomes": ["Explain photosynthesis"], "quiz": ["Q1"], "grade": "9"}
+
+    stats = {}
+    lesson = _client(lambda **kwargs: _reply(json.dumps(reply))).generate_lesson_plan_fields(**LESSON, stats=stats)
+    assert lesson == {
+        "learning_outcomes": ["Explain photosynthesis"],
+        "grade": "6",
+        "chapter_name": "Plants",
+        "topic_name": "Photosynthesis",
+        "page_no": "",
+        "lesson_plan_no": 1,
+    }
+    assert stats["schema_retries"] == 1
+    assert stats["schema_filtered"] is True
+
+
+def test_sections_from_a_retried_stream_are_withdrawn(monkeypatch):
+    monkeypatch.setattr(llm_client, "build_response_format", lambda sections: None)
+    replies = [
+        '{"learning_outcomes": ["First draft"], "teaching_aids": ["Chart"]',  # cut off: not valid JSON
+        '{"learning_outcomes": ["Final"]}',
+    ]
+
+    shown = []
+
+    def on_section(key, value):
+        shown.append((key, value))
+
+    lesson = _client(lambda **kwargs: _Stream(replies.pop(0))).generate_lesson_plan_fields(
+        **LESSON, on_section=on_section, on_reset=shown.clear,
+    )
+    assert lesson["learning_outcomes"] == ["Final"]
+    assert shown == [("learning_outcomes", ["Final"])]
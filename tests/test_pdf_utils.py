@@ -0,0 +1,45 @@
+# tests/test_pdf_utils.py
+import fitz
+
+from pdf_utils import parse_page_selection, resolve_page_selection
+
+
+def _blank_pdf(num_pages: int) -> bytes:
+    doc = fitz.open()
+    for _ in range(num_pages):
+        doc.new_page()
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def test_parse_ranges_are_sorted_and_merged():
+    assert parse_page_selection("22, 12-18") == [(12, 18), (22, 22)]
+    assert parse_page_selection("1-3, 4-6, 5") == [(1, 6)]
+    assert parse_page_selection("pp. 112–131") == [(112, 131)]
+    assert parse_page_selection("Pages 9-7") == [(7, 9)]
+
+
+def test_parse_whole_document_values():
+    assert parse_page_selection(None) is None
+    assert parse_page_selection("  ") is None
+    assert parse_page_selection("chapter 3") is None
+    assert parse_page_selection("4-6, intro") is None
+
+
+def test_resolve_keeps_selection_inside_document():
+    assert resolve_page_selection(_blank_pdf(40), "10-20") == ([(10, 20)], None)
+    assert resolve_page_selection(_blank_pdf(40), "") == (None, None)
+
+
+def test_resolve_clips_selection_past_the_end():
+    ranges, warning = resolve_page_selection(_blank_pdf(40), "10-80, 90")
+    assert ranges == [(10, 40)]
+    assert "40 pages" in warning
+
+
+def test_resolve_falls_back_to_whole_document():
+    ranges, warning = resolve_page_selection(_blank_pdf(40), "112-131")
+    assert ranges is None
+    assert "whole document" in warning
@@ -0,0 +1,87 @@
+# tests/test_rate_limiter.py
+import threading
+import time
+
+import pytest
+
+from hedging import RequestCancelled
+from rate_limiter import FairRateLimiter
+
+
+def _drained(requests_per_minute: int) -> FairRateLimiter:
+    limiter = FairRateLimiter(requests_per_minute, 10 ** 9)
+    for _ in range(requests_per_minute):
+        limiter.acquire("warmup", 1)
+    return limiter
+
+
+def test_sessions_are_served_round_robin():
+    # 5 requests/second after the burst: every request below has to queue
+    limiter = _drained(300)
+    served = []
+    lock = threading.Lock()
+
+    def request(session_id: str) -> None:
+        limiter.acquire(session_id, 1)
+        with lock:
+            served.append(session_id)
+
+    threads = []
+    for session_id in ["a", "a", "a", "a", "b", "b"]:
+        thread = threading.Thread(target=request, args=(session_id,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)  # fixes the enqueue order
+    for thread in threads:
+        thread.join()
+
+    # "b" arrived behind four of "a"'s requests but alternates with them
+    assert served == ["a", "b", "a", "b", "a", "a"]
+
+
+def test_snapshot_reports_position_and_wait():
+    limiter = _drained(60)
+    waiting = threading.Thread(target=limiter.acquire, args=("a", 1))
+    waiting.start()
+    time.sleep(0.05)
+    info = limiter.snapshot("b")
+    assert info == {"queue_depth": 1, "position": None}
+    info = limiter.snapshot("a")
+    assert info["position"] == 1
+    assert 0.0 < info["estimated_wait_s"] <= 1.0
+    waiting.join()
+
+
+def test_reconcile_corrects_the_token_bucket():
+    limiter = FairRateLimiter(1000, 60)
+    limiter.acquire("a", 50)
+    assert limiter._token_level == pytest.approx(10, abs=0.1)
+    # Reply used fewer tokens than estimated: the difference goes back
+    limiter.reconcile(50, 20)
+    assert limiter._token_level == pytest.approx(40, abs=0.1)
+    # Never above capacity
+    limiter.reconcile(50, 0)
+    assert limiter._token_level == pytest.approx(60, abs=0.1)
+    # A reply larger than estimated is charged too
+    limiter.reconcile(10, 70)
+    assert limiter._token_level == pytest.approx(0, abs=0.1)
+
+
+def test_cancelled_waiter_leaves_queue_without_quota():
+    limiter = _drained(60)
+    cancel = threading.Event()
+    errors = []
+
+    def request() -> None:
+        try:
+            limiter.acquire("a", 1, cancel)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    time.sleep(0.05)
+    cancel.set()
+    thread.join()
+    assert len(errors) == 1
+    assert limiter.snapshot()["queue_depth"] == 0
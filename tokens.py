@@ -0,0 +1,91 @@
+# tokens.py
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from config import (
+    GROQ_MODEL,
+    TOKENIZER_FALLBACK_ENCODING,
+    MODEL_CONTEXT_WINDOWS,
+    DEFAULT_CONTEXT_WINDOW,
+    GROQ_TOKENS_PER_MINUTE,
+    PROMPT_TEMPLATE_TOKENS,
+    MAX_COMPLETION_TOKENS,
+    EXPECTED_COMPLETION_TOKENS,
+    LLM_MAX_BATCH_SIZE,
+)
+
+# Per-lesson header ("--- LESSON n ---", topic line) inside a batched prompt
+BATCH_LESSON_OVERHEAD_TOKENS = 40
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: Optional[str] = None) -> "tiktoken.Encoding":
+    """
+    Cached tiktoken encoder for the model (falls back to a generic encoding).
+    """
+    try:
+        return tiktoken.encoding_for_model(model or GROQ_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding(TOKENIZER_FALLBACK_ENCODING)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    return len(get_encoder(model).encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Cuts text into consecutive pieces of at most max_tokens tokens.
+    """
+    encoder = get_encoder(model)
+    token_ids = encoder.encode(text, disallowed_special=())
+    return [
+        encoder.decode(token_ids[i:i + max_tokens])
+        for i in range(0, len(token_ids), max_tokens)
+    ]
+
+
+def chunk_token_budget(model: Optional[str] = None) -> int:
+    """
+    Max lesson-text tokens per request: what is left of the context window
+    (and of one minute of TPM quota) after the prompt template and the
+    reserved completion.
+    """
+    context_window = MODEL_CONTEXT_WINDOWS.get(model or GROQ_MODEL, DEFAULT_CONTEXT_WINDOW)
+    request_limit = min(context_window, GROQ_TOKENS_PER_MINUTE)
+    return max(256, request_limit - PROMPT_TEMPLATE_TOKENS - MAX_COMPLETION_TOKENS)
+
+
+def plan_lesson_batches(
+    chunk_tokens: List[int],
+    model: Optional[str] = None,
+    max_batch_size: int = LLM_MAX_BATCH_SIZE,
+) -> List[List[int]]:
+    """
+    Groups consecutive lesson indices into multi-lesson requests that fit one
+    request's token limit: the shared prompt once, plus each lesson's text,
+    header and expected completion.
+    """
+    context_window = MODEL_CONTEXT_WINDOWS.get(model or GROQ_MODEL, DEFAULT_CONTEXT_WINDOW)
+    request_limit = min(context_window, GROQ_TOKENS_PER_MINUTE)
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = PROMPT_TEMPLATE_TOKENS
+    for i, tokens in enumerate(chunk_tokens):
+        lesson_cost = tokens + BATCH_LESSON_OVERHEAD_TOKENS + EXPECTED_COMPLETION_TOKENS
+        if current and (
+            current_tokens + lesson_cost > request_limit or len(current) >= max_batch_size
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = PROMPT_TEMPLATE_TOKENS
+        current.append(i)
+        current_tokens += lesson_cost
+    if current:
+        batches.append(current)
+    return batches